@@ -0,0 +1,75 @@
+"""Compare fuzzy city lookup latency: full difflib scan vs. trigram index.
+
+Run from the repository root:
+
+    python -m benchmarks.fuzzy_search
+"""
+
+import random
+import statistics
+import time
+from difflib import get_close_matches
+
+from weather.mappings import fuzzy_search, get_all_cities
+
+QUERY_COUNT = 25
+SEED = 2024
+
+
+def make_typo(city: str, rng: random.Random) -> str:
+    """Drop, swap or duplicate one character of the city name"""
+    position = rng.randrange(len(city))
+    action = rng.choice(("drop", "swap", "duplicate"))
+    if action == "drop":
+        return city[:position] + city[position + 1 :]
+    if action == "swap" and position < len(city) - 1:
+        return (
+            city[:position] + city[position + 1] + city[position] + city[position + 2 :]
+        )
+    return city[:position] + city[position] + city[position:]
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def time_queries(search, queries: list[str]) -> list[float]:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def difflib_search(city: str) -> list[str]:
+    return get_close_matches(city, get_all_cities())
+
+
+def main() -> None:
+    rng = random.Random(SEED)
+    city_list = get_all_cities()
+    sample = rng.sample(range(len(city_list)), QUERY_COUNT * 4)
+    cities = [city_list[i] for i in sample if len(city_list[i]) > 4]
+    queries = [make_typo(city, rng).title() for city in cities[:QUERY_COUNT]]
+
+    # Build (or load) the index once so the indexed timings are steady state.
+    fuzzy_search(queries[0])
+
+    agreements = sum(
+        (fuzzy_search(query) or [None])[0] == (difflib_search(query) or [None])[0]
+        for query in queries
+    )
+    for name, search in (("difflib", difflib_search), ("trigram", fuzzy_search)):
+        timings = time_queries(search, queries)
+        print(
+            f"{name:8} p50={percentile(timings, 0.50) * 1000:9.2f}ms "
+            f"p99={percentile(timings, 0.99) * 1000:9.2f}ms "
+            f"mean={statistics.mean(timings) * 1000:9.2f}ms"
+        )
+    print(f"top match agreement: {agreements}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Time history range queries over a city with millions of observations.
+
+Run from the repository root:
+
+    python -m benchmarks.history
+"""
+
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from weather.history import (
+    RECORD,
+    append_observation,
+    get_history_path,
+    summarize_history,
+)
+from weather.mappings import Location, Observation
+
+RECORD_COUNT = 2_000_000
+INTERVAL = 60  # seconds between observations, about 3.8 years in total
+START = 1_600_000_000
+RUNS = 5
+RANGES = {
+    "last day": 86400,
+    "last week": 7 * 86400,
+    "last 30 days": 30 * 86400,
+    "everything": RECORD_COUNT * INTERVAL,
+}
+
+
+def write_history(path: Path) -> None:
+    with open(path, "wb") as file:
+        file.write(
+            b"".join(
+                RECORD.pack(START + i * INTERVAL, 280 + i % 25, 70, 4.5)
+                for i in range(RECORD_COUNT)
+            )
+        )
+
+
+def time_call(function, runs: int = RUNS) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        location = Location("Benchmark City", 0.0, 0.0)
+        path = get_history_path(directory, location)
+        write_history(path)
+        end = START + (RECORD_COUNT - 1) * INTERVAL
+        print(f"{RECORD_COUNT} records, {path.stat().st_size / 1e6:.0f} MB")
+        for name, span in RANGES.items():
+            elapsed = time_call(lambda: summarize_history(path, end - span, end))
+            print(f"{name:13} {span // INTERVAL:9} rows {elapsed * 1000:9.2f}ms")
+
+        observations = iter(
+            Observation(
+                location=location,
+                observed=end + i * INTERVAL,
+                weather_status="Clouds",
+                weather_description="broken clouds",
+                temperature=290.0,
+                humidity=70,
+                wind_speed=4.5,
+                wind_direction=240,
+            )
+            for i in range(1, 1001)
+        )
+
+        def append():
+            append_observation(directory, next(observations))
+
+        print(f"append        {time_call(append, 1000) * 1e6:9.1f}us")
+
+
+if __name__ == "__main__":
+    main()
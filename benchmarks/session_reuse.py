@@ -0,0 +1,60 @@
+"""Measure what the pooled keep-alive session saves over bare requests.get.
+
+Run from the repository root:
+
+    python -m benchmarks.session_reuse
+"""
+
+import os
+import time
+
+from .stand_in_server import StandInServer
+
+BATCH_SIZE = 50
+BATCH_COUNT = 5
+
+
+def run_batches(server: StandInServer, fetch) -> tuple[float, int]:
+    server.reset_counts()
+    start = time.perf_counter()
+    for batch in range(BATCH_COUNT):
+        for i in range(BATCH_SIZE):
+            fetch(f"{server.base_url}weather?q=city{batch}-{i}&appid=benchmark")
+    return time.perf_counter() - start, server.connection_count
+
+
+def main() -> None:
+    with StandInServer() as server:
+        os.environ["BASE_URL"] = server.base_url
+        os.environ.setdefault("API_KEY", "benchmark")
+        # The stand-in server has no quota; keep the limiter out of the timings.
+        os.environ.setdefault("API_CALLS_PER_MINUTE", "0")
+
+        import requests
+
+        from weather import weather_api
+
+        timeout = (weather_api.CONNECT_TIMEOUT, weather_api.READ_TIMEOUT)
+
+        def bare_fetch(url):
+            return requests.get(url, timeout=timeout).json()
+
+        call_count = BATCH_SIZE * BATCH_COUNT
+        for name, fetch in (("bare", bare_fetch), ("pooled", weather_api.fetch_json)):
+            # Measure the transport only, not the response cache.
+            with weather_api.get_session().cache_disabled():
+                elapsed, connections = run_batches(server, fetch)
+            print(
+                f"{name:7} {call_count} calls in {elapsed * 1000:8.1f}ms "
+                f"({elapsed / call_count * 1e6:7.1f}us/call), "
+                f"{connections} TCP connections"
+            )
+
+        server.reset_counts()
+        server.failures_left = 2
+        weather_api.fetch_json(f"{server.base_url}weather?q=retry&appid=benchmark")
+        print(f"retry   2 injected 503s recovered in {server.request_count} requests")
+
+
+if __name__ == "__main__":
+    main()
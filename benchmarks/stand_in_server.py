@@ -0,0 +1,128 @@
+"""A local HTTP server that answers like the OpenWeather endpoints we use.
+
+Point the package at it with BASE_URL=http://127.0.0.1:<port>/ and it serves
+the payloads in benchmarks/fixtures from /weather, /forecast and the
+multi-city /group endpoint, counting requests and TCP connections.
+"""
+
+import json
+import socket
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+UNKNOWN_CITIES = {"nowhere"}
+UNKNOWN_CITY_IDS = {0}
+MAX_GROUP_SIZE = 20
+
+
+def load_fixture(name: str) -> dict:
+    with open(FIXTURES_DIR / f"{name}.json", encoding="utf-8") as file:
+        return json.load(file)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; don't let Nagle stall them.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connection_count += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.request_count += 1
+            failing = self.server.failures_left > 0
+            if failing:
+                self.server.failures_left -= 1
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if failing:
+            status = self.server.failure_status
+            self.send_json(
+                status, {"cod": status, "message": HTTPStatus(status).phrase.lower()}
+            )
+            return
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        endpoint = url.path.rsplit("/", 1)[-1]
+        if endpoint == "weather":
+            city = query.get("q", [""])[0]
+            if city.casefold() in UNKNOWN_CITIES:
+                self.send_json(404, self.server.fixtures["not_found"])
+                return
+            payload = dict(self.server.fixtures["weather"], name=city.title())
+            self.send_json(200, payload)
+        elif endpoint == "group":
+            city_ids = [
+                int(city_id)
+                for city_id in query.get("id", [""])[0].split(",")
+                if city_id.isdigit()
+            ]
+            if not city_ids or len(city_ids) > MAX_GROUP_SIZE:
+                self.send_json(400, {"cod": "400", "message": "Invalid id list"})
+                return
+            weather = dict(self.server.fixtures["weather"])
+            del weather["cod"]
+            entries = [
+                dict(weather, id=city_id, name=f"City {city_id}")
+                for city_id in city_ids
+                if city_id not in UNKNOWN_CITY_IDS
+            ]
+            self.send_json(200, {"cnt": len(entries), "list": entries})
+        elif endpoint == "forecast":
+            self.send_json(200, self.server.fixtures["forecast"])
+        else:
+            self.send_json(404, {"cod": "404", "message": "Internal error"})
+
+    def send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.connection_count = 0
+        self.request_count = 0
+        self.failures_left = 0
+        self.failure_status = 503
+        self.fixtures = {
+            name: load_fixture(name) for name in ("weather", "forecast", "not_found")
+        }
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def reset_counts(self) -> None:
+        with self.lock:
+            self.connection_count = 0
+            self.request_count = 0
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
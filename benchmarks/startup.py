@@ -0,0 +1,67 @@
+"""Measure CLI startup cost for every command with ``python -X importtime``.
+
+Each command is launched as ``python -X importtime -m weather <command> --help``
+so only the imports paid before the command body runs are counted.
+Run from the repository root:
+
+    python -m benchmarks.startup
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 5
+HEAVY_MODULES = ("requests", "requests_cache", "urllib3", "decouple")
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    """Return the cumulative import time in microseconds of each module"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:") :].split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def measure(command: str) -> tuple[float, float, list[str]]:
+    wall_times = []
+    import_times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "weather", command, "--help"],
+            capture_output=True,
+            text=True,
+            env=dict(os.environ, API_KEY=os.environ.get("API_KEY", "benchmark")),
+            check=True,
+        )
+        wall_times.append(time.perf_counter() - start)
+        cumulative = parse_importtime(result.stderr)
+        import_times.append(cumulative.get("weather.typer_functions", 0))
+    loaded = [module for module in HEAVY_MODULES if module in cumulative]
+    return statistics.median(wall_times), statistics.median(import_times), loaded
+
+
+def main() -> None:
+    from weather.typer_functions import app
+
+    commands = [
+        command.name or command.callback.__name__.replace("_", "-")
+        for command in app.registered_commands
+    ]
+    for command in commands:
+        wall_time, import_time, loaded = measure(command)
+        print(
+            f"{command:18} wall={wall_time * 1000:7.1f}ms "
+            f"weather imports={import_time / 1000:7.1f}ms "
+            f"heavy={','.join(loaded) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
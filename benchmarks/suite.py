@@ -0,0 +1,206 @@
+"""Offline benchmark suite for the hot paths and every Typer command.
+
+Replays the payloads in benchmarks/fixtures through the local stand-in
+server, times each pipeline stage in isolation and each command end to end,
+and writes the results as JSON so two runs can be diffed:
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json
+    python -m benchmarks.suite --compare before.json after.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import UTC, datetime
+
+from .stand_in_server import StandInServer, load_fixture
+
+STAGE_RUNS = 200
+COMMAND_RUNS = 20
+FUZZY_QUERIES = ("Londn", "Pariss", "Tokio", "Berln", "Amsterdm", "Sao Paolo")
+REGRESSION_THRESHOLD = 1.10
+
+
+def summarize(timings: list[float]) -> dict:
+    ordered = sorted(timings)
+    return {
+        "runs": len(ordered),
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, round(0.99 * (len(ordered) - 1)))]
+        * 1000,
+        "mean_ms": statistics.mean(ordered) * 1000,
+    }
+
+
+def time_calls(function, runs: int, setup=None) -> dict:
+    timings = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def bench_stages(runs: int) -> dict:
+    from weather import mappings, output, weather_api
+
+    weather_json = load_fixture("weather")
+    forecast_json = load_fixture("forecast")
+    bad_request_json = {"cod": "400", "message": "Nothing to geocode"}
+    city_info = mappings.parse_observation(weather_json)
+    ranked_cities = [(f"City {i}", city_info) for i in range(10)]
+    queries = iter(FUZZY_QUERIES * runs)
+    # Load the gazetteer and trigram index once; steady state is what we track.
+    mappings.fuzzy_search(FUZZY_QUERIES[0])
+
+    stages = {
+        "fuzzy_search": lambda: mappings.fuzzy_search(next(queries)),
+        "parse_api_response.ok": lambda: weather_api.parse_api_response(
+            city_info, False, "London"
+        ),
+        "parse_api_response.bad_request": lambda: weather_api.parse_api_response(
+            bad_request_json, True, "London"
+        ),
+        "parse_forecast_response": lambda: mappings.parse_forecast_response(
+            forecast_json
+        ),
+        "get_wind_direction": lambda: [
+            mappings.get_wind_direction(angle) for angle in range(360)
+        ],
+        "parse_observation": lambda: mappings.parse_observation(weather_json),
+        "get_weather_descriptions": lambda: mappings.get_weather_descriptions(
+            city_info
+        ),
+        "print_weather_descriptions": lambda: output.print_weather_descriptions(
+            city_info, mappings.UnitType.CELSIUS
+        ),
+        "print_compared_weather": lambda: output.print_compared_weather(
+            "London", city_info, "Paris", city_info
+        ),
+        "print_compared_temperature": lambda: output.print_compared_temperature(
+            "London", city_info, "Paris", city_info, mappings.UnitType.CELSIUS
+        ),
+        "print_ranked_cities": lambda: output.print_ranked_cities(
+            ranked_cities, mappings.UnitType.CELSIUS
+        ),
+    }
+
+    results = {}
+    output.console.file = io.StringIO()
+    try:
+        for name, function in stages.items():
+            stage_runs = max(1, runs // 10) if name == "fuzzy_search" else runs
+            results[f"stage.{name}"] = time_calls(
+                function, stage_runs, setup=lambda: output.console.file.truncate(0)
+            )
+    finally:
+        output.console.file = sys.stdout
+    return results
+
+
+def bench_commands(runs: int) -> dict:
+    from typer.testing import CliRunner
+
+    from weather import weather_api
+    from weather.typer_functions import app
+
+    runner = CliRunner()
+    commands = {
+        "check-weather": (["check-weather", "london"], None),
+        "check-weather.typo": (["check-weather", "nowhere"], "1\n"),
+        "check-comparison": (["check-comparison", "paris", "oslo"], None),
+        "check-ranking": (["check-ranking", "paris", "oslo", "rome", "lima"], None),
+        "check-forecast": (["check-forecast", "london"], None),
+        "check-batch": (["check-batch"], "paris\noslo\nrome\nlima\n"),
+    }
+
+    def clear_caches():
+        weather_api.weather_cache.clear()
+        weather_api.forecast_cache.clear()
+
+    results = {}
+    # Every run goes upstream to the stand-in server: no sqlite or memory hits.
+    with weather_api.get_session().cache_disabled():
+        for name, (args, command_input) in commands.items():
+
+            def invoke():
+                result = runner.invoke(app, args, input=command_input)
+                if result.exit_code != 0:
+                    raise RuntimeError(f"{name} failed: {result.output}")
+
+            results[f"command.{name}"] = time_calls(invoke, runs, setup=clear_caches)
+    return results
+
+
+def run_suite(stage_runs: int, command_runs: int) -> dict:
+    with StandInServer() as server:
+        os.environ["BASE_URL"] = server.base_url
+        os.environ.setdefault("API_KEY", "benchmark")
+        # The stand-in server has no quota; keep the limiter out of the timings.
+        os.environ.setdefault("API_CALLS_PER_MINUTE", "0")
+        # Keep check-weather.typo on the fuzzy path instead of a remembered alias.
+        os.environ.setdefault("ALIAS_CAPACITY", "0")
+        # Fixture observations must not end up in the user's real history.
+        os.environ.setdefault("HISTORY_DIR", "")
+        results = bench_commands(command_runs)
+        results.update(bench_stages(stage_runs))
+    return {
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(before_path: str, after_path: str) -> int:
+    """Print p50 changes between two result files; non-zero on regressions"""
+    with open(before_path, encoding="utf-8") as file:
+        before = json.load(file)["results"]
+    with open(after_path, encoding="utf-8") as file:
+        after = json.load(file)["results"]
+    regressions = 0
+    for name in sorted(before.keys() | after.keys()):
+        if name not in before or name not in after:
+            print(f"{name:40} only in {'after' if name in after else 'before'}")
+            continue
+        ratio = after[name]["p50_ms"] / before[name]["p50_ms"]
+        flag = "  REGRESSION" if ratio > REGRESSION_THRESHOLD else ""
+        regressions += bool(flag)
+        print(
+            f"{name:40} {before[name]['p50_ms']:10.3f}ms -> "
+            f"{after[name]['p50_ms']:10.3f}ms  x{ratio:5.2f}{flag}"
+        )
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--stage-runs", type=int, default=STAGE_RUNS)
+    parser.add_argument("--command-runs", type=int, default=COMMAND_RUNS)
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Diff two results"
+    )
+    arguments = parser.parse_args()
+    if arguments.compare:
+        return compare(*arguments.compare)
+
+    report = run_suite(arguments.stage_runs, arguments.command_runs)
+    for name, result in report["results"].items():
+        print(f"{name:40} p50={result['p50_ms']:9.3f}ms p99={result['p99_ms']:9.3f}ms")
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import pytest
+
+from benchmarks.stand_in_server import StandInServer
+from weather import aliases, circuit_breaker, rate_limit, weather_api
+from weather.circuit_breaker import CircuitBreaker
+
+
+class Clock:
+    """Stands in for the time module where wall-clock time matters"""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    for module in (aliases, circuit_breaker, rate_limit):
+        monkeypatch.setattr(module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    """Point weather_api at a fresh stand-in server, with every store in tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    with StandInServer() as server:
+        monkeypatch.setattr(weather_api, "BASE_URL", server.base_url)
+        monkeypatch.setattr(weather_api, "get_api_key", lambda: "test")
+        monkeypatch.setattr(weather_api, "API_CALLS_PER_MINUTE", 0)
+        monkeypatch.setattr(weather_api, "ALIAS_CAPACITY", 0)
+        monkeypatch.setattr(weather_api, "HISTORY_DIR", "")
+        monkeypatch.setattr(weather_api, "RETRY_BACKOFF", 0)
+        monkeypatch.setattr(weather_api, "RETRY_JITTER", 0)
+        monkeypatch.setattr(
+            weather_api,
+            "upstream_breaker",
+            CircuitBreaker(str(tmp_path / "circuit_breaker.db"), 5, 30.0),
+        )
+        monkeypatch.setattr(weather_api, "_session", None)
+        weather_api.weather_cache.clear()
+        weather_api.forecast_cache.clear()
+        try:
+            yield server
+        finally:
+            weather_api.join_refreshes(5.0)
+            if weather_api._session is not None:
+                weather_api._session.close()
+            weather_api.weather_cache.clear()
+            weather_api.forecast_cache.clear()
@@ -0,0 +1,65 @@
+from weather.aliases import AliasStore
+
+
+def make_store(tmp_path, capacity):
+    return AliasStore(str(tmp_path / "aliases.db"), capacity)
+
+
+def test_remembers_what_an_alias_resolved_to(tmp_path, clock):
+    store = make_store(tmp_path, 10)
+    assert store.get("londn") is None
+    store.set("londn", "London", 51.5085, -0.1257)
+    assert store.get("londn") == ("London", 51.5085, -0.1257)
+
+
+def test_evicts_the_least_used_entries_first(tmp_path, clock):
+    store = make_store(tmp_path, 2)
+    store.set("londn", "London", 51.5, -0.1)
+    clock.advance(1)
+    store.set("pariss", "Paris", 48.9, 2.3)
+    clock.advance(1)
+    store.get("londn")
+    clock.advance(1)
+    store.set("tokio", "Tokyo", 35.7, 139.7)
+
+    assert store.get("pariss") is None
+    assert store.get("londn") is not None
+    assert store.get("tokio") is not None
+
+
+def test_evicts_the_oldest_among_equally_used_entries(tmp_path, clock):
+    store = make_store(tmp_path, 2)
+    store.set("londn", "London", 51.5, -0.1)
+    clock.advance(1)
+    store.set("pariss", "Paris", 48.9, 2.3)
+    clock.advance(1)
+    store.set("tokio", "Tokyo", 35.7, 139.7)
+
+    assert store.get("londn") is None
+    assert store.get("pariss") is not None
+
+
+def test_never_evicts_the_entry_being_written(tmp_path, clock):
+    store = make_store(tmp_path, 1)
+    store.set("londn", "London", 51.5, -0.1)
+    for _ in range(3):
+        store.get("londn")
+    store.set("pariss", "Paris", 48.9, 2.3)
+
+    assert store.get("pariss") == ("Paris", 48.9, 2.3)
+    assert store.get("londn") is None
+
+
+def test_overwriting_an_alias_keeps_its_hits(tmp_path, clock):
+    store = make_store(tmp_path, 2)
+    store.set("londn", "London", 51.5, -0.1)
+    store.get("londn")
+    clock.advance(1)
+    store.set("pariss", "Paris", 48.9, 2.3)
+    clock.advance(1)
+    store.set("londn", "London", 51.51, -0.13)
+    clock.advance(1)
+    store.set("tokio", "Tokyo", 35.7, 139.7)
+
+    assert store.get("londn") == ("London", 51.51, -0.13)
+    assert store.get("pariss") is None
@@ -0,0 +1,81 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from weather import weather_api
+from weather.cache import SingleFlight
+
+
+def start_blocked_flight(flight: SingleFlight, key, result):
+    """Start a leader call that runs until the returned event is set"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def function():
+        started.set()
+        release.wait()
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    executor = ThreadPoolExecutor(1)
+    leader = executor.submit(flight.do, key, function)
+    started.wait()
+    executor.shutdown(wait=False)
+    return leader, release
+
+
+def wait_for_followers(flight: SingleFlight, count: int) -> None:
+    while flight.coalesced < count:
+        time.sleep(0.001)
+
+
+def test_identical_calls_in_flight_share_one_result():
+    flight = SingleFlight()
+    leader, release = start_blocked_flight(flight, "london", "result")
+    with ThreadPoolExecutor(3) as executor:
+        followers = [
+            executor.submit(flight.do, "london", lambda: "not called") for _ in range(3)
+        ]
+        wait_for_followers(flight, 3)
+        release.set()
+        assert [future.result() for future in followers] == ["result"] * 3
+    assert leader.result() == "result"
+    assert (flight.calls, flight.coalesced) == (1, 3)
+
+
+def test_followers_see_the_leaders_error():
+    flight = SingleFlight()
+    leader, release = start_blocked_flight(flight, "london", ValueError("down"))
+    with ThreadPoolExecutor(1) as executor:
+        follower = executor.submit(flight.do, "london", lambda: "not called")
+        wait_for_followers(flight, 1)
+        release.set()
+        with pytest.raises(ValueError):
+            follower.result()
+    with pytest.raises(ValueError):
+        leader.result()
+
+
+def test_different_keys_and_later_calls_run_on_their_own():
+    flight = SingleFlight()
+    assert flight.do("london", lambda: 1) == 1
+    assert flight.do("london", lambda: 2) == 2
+    assert flight.do("paris", lambda: 3) == 3
+    assert (flight.calls, flight.coalesced) == (3, 0)
+
+
+def test_concurrent_lookups_of_one_city_make_one_request(upstream):
+    upstream.delay = 0.2
+    calls = weather_api.weather_flight.calls
+    with ThreadPoolExecutor(4) as executor:
+        observations = list(
+            executor.map(
+                weather_api.call_api, ["london", "London", " LONDON", "london"]
+            )
+        )
+    assert all(observation is observations[0] for observation in observations)
+    assert upstream.request_count == 1
+    assert weather_api.weather_flight.calls == calls + 1
@@ -0,0 +1,89 @@
+from weather.circuit_breaker import CircuitBreaker
+
+
+def make_breaker(tmp_path, threshold=3, reset_timeout=30.0):
+    return CircuitBreaker(str(tmp_path / "breaker.db"), threshold, reset_timeout)
+
+
+def test_opens_after_consecutive_failures(tmp_path, clock):
+    breaker = make_breaker(tmp_path)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.times_opened == 1
+    assert breaker.rejections == 1
+
+
+def test_success_resets_the_failure_count(tmp_path, clock):
+    breaker = make_breaker(tmp_path)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_lets_one_trial_through_after_the_reset_timeout(tmp_path, clock):
+    breaker = make_breaker(tmp_path)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.advance(29)
+    assert not breaker.allow_request()
+
+    clock.advance(1)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_trial_reopens_for_another_reset_timeout(tmp_path, clock):
+    breaker = make_breaker(tmp_path)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.advance(29)
+    assert not breaker.allow_request()
+    clock.advance(1)
+    assert breaker.allow_request()
+    assert breaker.times_opened == 1
+
+
+def test_trial_that_never_reports_back_is_replaced(tmp_path, clock):
+    breaker = make_breaker(tmp_path)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow_request()
+
+    clock.advance(30)
+    assert breaker.allow_request()
+
+
+def test_state_is_shared_through_the_file(tmp_path, clock):
+    # Two instances over one file stand for two processes.
+    first, second = make_breaker(tmp_path), make_breaker(tmp_path)
+    first.record_failure()
+    second.record_failure()
+    first.record_failure()
+    assert not second.allow_request()
+    assert second.state == CircuitBreaker.OPEN
+
+    clock.advance(30)
+    assert first.allow_request()
+    assert not second.allow_request()
+    first.record_success()
+    assert second.allow_request()
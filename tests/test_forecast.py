@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from weather.mappings import parse_forecast
+
+UTC = timezone.utc
+
+
+def make_response(entries, timezone_offset=None):
+    """Build a forecast response from (UTC datetime, weather, Kelvin) entries"""
+    city = {"name": "Tokyo", "coord": {"lat": 35.6895, "lon": 139.6917}}
+    if timezone_offset is not None:
+        city["timezone"] = timezone_offset
+    return {
+        "city": city,
+        "list": [
+            {
+                "dt": int(moment.timestamp()),
+                "weather": [{"main": weather}],
+                "main": {"temp": temperature},
+            }
+            for moment, weather, temperature in entries
+        ],
+    }
+
+
+def test_entries_are_bucketed_by_the_city_local_date():
+    response = make_response(
+        [
+            (datetime(2025, 9, 1, 12, tzinfo=UTC), "Clear", 290.0),
+            # 9 pm UTC is already the next morning at UTC+9.
+            (datetime(2025, 9, 1, 21, tzinfo=UTC), "Rain", 280.0),
+            (datetime(2025, 9, 2, 3, tzinfo=UTC), "Rain", 300.0),
+        ],
+        timezone_offset=9 * 3600,
+    )
+    days = parse_forecast(response).days
+    assert [day.date for day in days] == ["2025-09-01", "2025-09-02"]
+    assert days[0].temperature_average == 290.0
+    assert days[1].weather_status == "Rain"
+    assert (days[1].temperature_min, days[1].temperature_max) == (280.0, 300.0)
+    assert days[1].temperature_average == pytest.approx(290.0)
+
+
+def test_negative_offsets_move_entries_to_the_previous_date():
+    response = make_response(
+        [(datetime(2025, 9, 2, 2, tzinfo=UTC), "Clouds", 285.0)],
+        timezone_offset=-5 * 3600,
+    )
+    assert [day.date for day in parse_forecast(response).days] == ["2025-09-01"]
+
+
+def test_responses_without_an_offset_are_bucketed_in_utc():
+    response = make_response(
+        [
+            (datetime(2025, 9, 1, 23, tzinfo=UTC), "Clear", 285.0),
+            (datetime(2025, 9, 2, 0, tzinfo=UTC), "Clear", 285.0),
+        ]
+    )
+    assert [day.date for day in parse_forecast(response).days] == [
+        "2025-09-01",
+        "2025-09-02",
+    ]
@@ -0,0 +1,81 @@
+import pytest
+
+from weather import mappings, weather_api
+from weather.city_index import build_trigram_index, get_candidate_ids
+from weather.mappings import CityMatch, pick_city_match
+from weather.weather_api import get_unresolved_outcome
+
+CITIES = ["Paris", "Parista", "Parisot", "Prissé", "Polaris", "London", "Londrina"]
+
+
+@pytest.fixture
+def cities(monkeypatch):
+    monkeypatch.setattr(mappings, "get_all_cities", lambda: CITIES)
+    monkeypatch.setattr(
+        mappings,
+        "get_trigram_index",
+        lambda city_list, _: build_trigram_index(city_list),
+    )
+    return CITIES
+
+
+def test_candidates_tied_at_the_limit_are_all_kept():
+    trigram_index = build_trigram_index(["Aab", "Xab", "Yab", "Zzz"])
+    # All three share "ab " with the input; a limit of one keeps every tie.
+    assert get_candidate_ids("Qab", trigram_index, limit=1) == [0, 1, 2]
+
+
+def test_candidates_are_ordered_by_shared_trigrams_then_position():
+    trigram_index = build_trigram_index(["Londrina", "London", "Paris"])
+    assert get_candidate_ids("Londo", trigram_index, limit=1) == [1]
+    assert get_candidate_ids("Londo", trigram_index) == [1, 0]
+
+
+def test_ranks_the_closest_names_first(cities):
+    matches = mappings.rank_city_matches("Pariss")
+    assert [match.name for match in matches] == ["Paris", "Prissé", "Polaris"]
+    assert matches[0].score == pytest.approx(10 / 11)
+
+
+def test_names_below_the_cutoff_are_not_offered(cities):
+    assert mappings.rank_city_matches("Tokyo") == []
+    assert mappings.fuzzy_search("Tokyo") is None
+
+
+def test_unattended_runs_take_a_confident_match():
+    matches = [CityMatch("Paris", 0.91), CityMatch("Prissé", 0.83)]
+    assert pick_city_match(matches, 0.85) == matches[0]
+    assert pick_city_match(matches, 0.91) == matches[0]
+
+
+def test_unattended_runs_refuse_a_weak_or_tied_match():
+    assert pick_city_match([], 0.85) is None
+    assert pick_city_match([CityMatch("Paris", 0.84)], 0.85) is None
+    tied = [CityMatch("Springfield", 0.95), CityMatch("Springfeld", 0.95)]
+    assert pick_city_match(tied, 0.85) is None
+
+
+def test_unresolved_matches_are_counted_by_reason():
+    assert get_unresolved_outcome([]) == "no_match"
+    assert get_unresolved_outcome([CityMatch("Paris", 0.5)]) == "low_confidence"
+    tied = [CityMatch("Paris", 0.9), CityMatch("Parts", 0.9)]
+    assert get_unresolved_outcome(tied) == "ambiguous"
+
+
+def test_unattended_lookups_resolve_or_fail_without_prompting(cities, monkeypatch):
+    def prompt(_):
+        raise AssertionError("prompted")
+
+    monkeypatch.setattr(weather_api.console, "input", prompt)
+    assert (
+        weather_api.resolve_city_matches(
+            mappings.rank_city_matches("Pariss"), interactive=False
+        )
+        == "Paris"
+    )
+    assert (
+        weather_api.resolve_city_matches(
+            mappings.rank_city_matches("Lodnon"), interactive=False
+        )
+        is None
+    )
@@ -0,0 +1,103 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from weather.gazetteer import Gazetteer, compile_gazetteer, fold_name, get_distance_km
+
+# (name, lat, lon, population) written out as GeoNames rows.
+CITIES = [
+    ("London", 51.50853, -0.12574, 8961989),
+    ("London", 42.98339, -81.23304, 346765),
+    ("Paris", 48.85341, 2.3488, 2138551),
+    ("São Paulo", -23.5475, -46.63611, 10021295),
+    ("Sao Tome", 0.33654, 6.72732, 53300),
+    ("Fiji East", -17.0, 179.9, 10),
+    ("Fiji West", -17.0, -179.9, 10),
+    ("Alert", 82.50178, -62.34813, 62),
+]
+
+
+def write_geonames(path, cities):
+    with open(path, "w", encoding="utf-8") as file:
+        for geonameid, (name, lat, lon, population) in enumerate(cities, start=1000):
+            fields = [""] * 19
+            fields[0], fields[1], fields[2] = str(geonameid), name, name
+            fields[4], fields[5], fields[14] = str(lat), str(lon), str(population)
+            file.write("\t".join(fields) + "\n")
+
+
+def compile_cities(tmp_path, cities):
+    source = tmp_path / "cities.txt"
+    write_geonames(source, cities)
+    compile_gazetteer(source, tmp_path / "cities.gaz")
+    gazetteer = Gazetteer(tmp_path / "cities.gaz")
+    gazetteer.open()
+    return gazetteer
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    return compile_cities(tmp_path, CITIES)
+
+
+def brute_force_nearest(gazetteer, lat, lon, count):
+    return sorted(
+        (get_distance_km(lat, lon, *gazetteer.coordinates(city_id)), city_id)
+        for city_id in range(len(gazetteer))
+    )[:count]
+
+
+def test_exact_lookup_prefers_the_most_populous_city(gazetteer):
+    city_id = gazetteer.find("london")
+    assert gazetteer[city_id] == "London"
+    assert gazetteer.geonameid(city_id) == 1000
+    assert gazetteer.find("Londn") is None
+
+
+def test_concurrent_compiles_do_not_share_a_temporary_file(tmp_path):
+    source = tmp_path / "cities.txt"
+    write_geonames(source, CITIES * 200)
+    destination = tmp_path / "cities.gaz"
+    with ThreadPoolExecutor(8) as executor:
+        for future in [
+            executor.submit(compile_gazetteer, source, destination) for _ in range(8)
+        ]:
+            future.result()
+    assert list(tmp_path.glob("*.tmp")) == []
+    gazetteer = Gazetteer(destination)
+    gazetteer.open()
+    assert len(gazetteer) == len(CITIES) * 200
+
+
+def test_completion_ignores_accents_and_case(gazetteer):
+    assert fold_name("São-Paulo") == "sao paulo"
+    assert gazetteer.complete("sao p", 10) == ["São Paulo"]
+    assert gazetteer.complete("SAO", 10) == ["São Paulo", "Sao Tome"]
+    assert gazetteer.complete("lon", 10) == ["London"]
+
+
+def test_nearest_crosses_the_antimeridian(gazetteer):
+    nearest = gazetteer.nearest(-17.0, 179.95, 2)
+    assert [gazetteer[city_id] for _, city_id in nearest] == ["Fiji East", "Fiji West"]
+
+
+def test_nearest_matches_a_brute_force_scan(tmp_path):
+    rng = random.Random(5)
+    cities = [
+        (f"City {i}", rng.uniform(-89.9, 89.9), rng.uniform(-180, 180), i)
+        for i in range(3000)
+    ]
+    # A dense cluster makes the search stop early; the poles widen the boxes.
+    cities += [
+        (f"Town {i}", 48 + rng.random(), 2 + rng.random(), i) for i in range(500)
+    ]
+    gazetteer = compile_cities(tmp_path, cities)
+    points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(40)]
+    points += [(48.5, 2.5), (89.99, 0.0), (-89.99, 45.0), (0.0, 180.0)]
+    for lat, lon in points:
+        expected = brute_force_nearest(gazetteer, lat, lon, 5)
+        actual = gazetteer.nearest(lat, lon, 5)
+        assert [distance for distance, _ in actual] == pytest.approx(
+            [distance for distance, _ in expected]
+        )
@@ -0,0 +1,120 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from weather.history import (
+    LOCK_OFFSET,
+    RECORD,
+    append_observation,
+    find_history_paths,
+    get_history_path,
+    lock_file,
+    summarize_history,
+)
+from weather.mappings import Location, Observation
+
+LONDON = Location("London", 51.5085, -0.1257)
+
+
+def make_observation(observed, temperature=280.0, location=LONDON):
+    return Observation(
+        location=location,
+        observed=observed,
+        weather_status="Clouds",
+        weather_description="broken clouds",
+        temperature=temperature,
+        humidity=70,
+        wind_speed=4.5,
+        wind_direction=240,
+    )
+
+
+def test_only_newer_observations_are_appended(tmp_path):
+    assert append_observation(tmp_path, make_observation(100))
+    assert append_observation(tmp_path, make_observation(200))
+    assert not append_observation(tmp_path, make_observation(200))
+    assert not append_observation(tmp_path, make_observation(150))
+
+    data = get_history_path(tmp_path, LONDON).read_bytes()
+    assert [record[0] for record in RECORD.iter_unpack(data)] == [100, 200]
+
+
+def test_a_torn_last_record_is_dropped_on_the_next_append(tmp_path):
+    append_observation(tmp_path, make_observation(100))
+    path = get_history_path(tmp_path, LONDON)
+    with open(path, "ab") as file:
+        file.write(b"\x01\x02\x03")
+    assert append_observation(tmp_path, make_observation(200))
+    assert path.stat().st_size == 2 * RECORD.size
+
+
+def test_summary_covers_exactly_the_requested_range(tmp_path):
+    for i in range(1000):
+        append_observation(tmp_path, make_observation(1000 + i * 60, 270.0 + i % 10))
+    path = get_history_path(tmp_path, LONDON)
+
+    summary = summarize_history(path, 1000 + 100 * 60, 1000 + 199 * 60)
+    assert summary["observations"] == 100
+    assert summary["first_observed"] == 1000 + 100 * 60
+    assert summary["last_observed"] == 1000 + 199 * 60
+    assert summary["temperature_min"] == 270.0
+    assert summary["temperature_max"] == 279.0
+    assert summary["temperature_mean"] == pytest.approx(274.5)
+
+    # Bounds that fall between two records.
+    summary = summarize_history(path, 1000 + 100 * 60 - 1, 1000 + 100 * 60 + 1)
+    assert summary["observations"] == 1
+
+
+def test_empty_ranges_and_missing_files_have_no_summary(tmp_path):
+    append_observation(tmp_path, make_observation(1000))
+    path = get_history_path(tmp_path, LONDON)
+    assert summarize_history(path, 0, 999) is None
+    assert summarize_history(path, 1001, 2000) is None
+    assert summarize_history(tmp_path / "missing.obs", 0, 2000) is None
+
+
+def test_places_sharing_a_name_keep_separate_histories(tmp_path):
+    illinois = Location("Springfield", 39.8017, -89.6437)
+    missouri = Location("Springfield", 37.2153, -93.2982)
+    assert append_observation(tmp_path, make_observation(200, location=illinois))
+    assert append_observation(tmp_path, make_observation(100, location=missouri))
+
+    paths = find_history_paths(tmp_path, "springfield")
+    assert sorted(paths) == ["37.22,-93.30", "39.80,-89.64"]
+    assert find_history_paths(tmp_path, "Springfeld") == {}
+
+
+def test_accented_names_are_found_without_the_accents(tmp_path):
+    sao_paulo = Location("São Paulo", -23.5475, -46.6361)
+    append_observation(tmp_path, make_observation(100, location=sao_paulo))
+    assert list(find_history_paths(tmp_path, "sao paulo").values()) == [
+        get_history_path(tmp_path, sao_paulo)
+    ]
+
+
+def test_the_cli_imports_where_fcntl_is_missing():
+    root = Path(__file__).resolve().parent.parent
+    code = "import sys; sys.modules['fcntl'] = None; import weather.typer_functions"
+    env = dict(os.environ, PYTHONPATH=str(root))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=root, env=env)
+
+
+def test_windows_locks_a_byte_past_every_record(tmp_path, monkeypatch):
+    calls = []
+    msvcrt = SimpleNamespace(
+        LK_LOCK=1,
+        locking=lambda fd, mode, size: calls.append((os.lseek(fd, 0, 1), mode, size)),
+    )
+    monkeypatch.setitem(sys.modules, "fcntl", None)
+    monkeypatch.setitem(sys.modules, "msvcrt", msvcrt)
+    fd = os.open(tmp_path / "london.obs", os.O_RDWR | os.O_CREAT)
+    try:
+        lock_file(fd)
+    finally:
+        os.close(fd)
+    assert calls == [(LOCK_OFFSET, msvcrt.LK_LOCK, 1)]
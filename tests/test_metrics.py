@@ -0,0 +1,47 @@
+from weather.metrics import Registry
+
+
+def get_samples(registry: Registry) -> dict[str, str]:
+    return dict(
+        line.rsplit(" ", 1)
+        for line in registry.render().splitlines()
+        if not line.startswith("#")
+    )
+
+
+def test_counters_keep_every_digit():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("status",))
+    requests.inc("200", amount=1234567)
+    waited = registry.counter("wait_seconds_total", "Waiting")
+    waited.inc(amount=0.1234567891)
+    waited.inc(amount=1)
+
+    samples = get_samples(registry)
+    assert samples['requests_total{status="200"}'] == "1234567"
+    assert float(samples["wait_seconds_total"]) == 1.1234567891
+
+
+def test_histograms_count_cumulatively_and_sum_exactly():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", ("endpoint",))
+    for value in (0.001, 0.02, 0.3, 42.0):
+        latency.observe(value, "weather")
+
+    samples = get_samples(registry)
+    assert samples['latency_seconds_bucket{endpoint="weather",le="0.005"}'] == "1"
+    assert samples['latency_seconds_bucket{endpoint="weather",le="0.025"}'] == "2"
+    assert samples['latency_seconds_bucket{endpoint="weather",le="10.0"}'] == "3"
+    assert samples['latency_seconds_bucket{endpoint="weather",le="+Inf"}'] == "4"
+    assert samples['latency_seconds_count{endpoint="weather"}'] == "4"
+    assert float(samples['latency_seconds_sum{endpoint="weather"}']) == 42.321
+
+
+def test_collectors_are_read_when_rendering():
+    registry = Registry()
+    hits = {("weather",): 0}
+    registry.add_collector(
+        lambda: [("hits_total", "counter", "Hits", ("cache",), dict(hits))]
+    )
+    hits[("weather",)] = 10_000_001
+    assert get_samples(registry)['hits_total{cache="weather"}'] == "10000001"
@@ -0,0 +1,56 @@
+import pytest
+
+from weather.rate_limit import TokenBucket
+
+
+def make_bucket(tmp_path, calls_per_minute=60, burst=3):
+    return TokenBucket(str(tmp_path / "rate_limit.db"), calls_per_minute, burst)
+
+
+def test_burst_goes_through_without_waiting(tmp_path, clock):
+    bucket = make_bucket(tmp_path)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_callers_past_the_burst_queue_up_in_order(tmp_path, clock):
+    bucket = make_bucket(tmp_path)
+    for _ in range(3):
+        bucket.reserve()
+    assert bucket.reserve() == pytest.approx(1.0)
+    assert bucket.reserve() == pytest.approx(2.0)
+
+
+def test_tokens_refill_at_the_rate_up_to_the_burst(tmp_path, clock):
+    bucket = make_bucket(tmp_path)
+    for _ in range(3):
+        bucket.reserve()
+    clock.advance(2)
+    assert [bucket.reserve() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(1.0)
+
+    clock.advance(3600)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_acquire_sleeps_for_its_token(tmp_path, clock):
+    bucket = make_bucket(tmp_path, burst=1)
+    assert bucket.acquire() == 0.0
+    start = clock.now
+    assert bucket.acquire() == pytest.approx(1.0)
+    assert clock.now - start == pytest.approx(1.0)
+
+
+def test_buckets_over_one_file_share_tokens(tmp_path, clock):
+    first, second = make_bucket(tmp_path), make_bucket(tmp_path)
+    first.reserve()
+    second.reserve()
+    first.reserve()
+    assert second.reserve() == pytest.approx(1.0)
+
+
+def test_names_have_separate_buckets(tmp_path, clock):
+    bucket = make_bucket(tmp_path, burst=1)
+    bucket.reserve("weather")
+    assert bucket.reserve("forecast") == 0.0
+    assert bucket.reserve("weather") == pytest.approx(1.0)
@@ -0,0 +1,100 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from weather import weather_api
+from weather.server import PROMETHEUS_CONTENT_TYPE, WeatherRequestHandler
+
+
+@pytest.fixture
+def server(upstream):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WeatherRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def get_json(url: str) -> tuple[int, dict]:
+    try:
+        with urlopen(url) as response:
+            return response.status, json.load(response)
+    except HTTPError as error:
+        with error:
+            return error.code, json.load(error)
+
+
+def test_weather_returns_the_first_city(server):
+    status, payload = get_json(f"{server}/weather?city=london&city=paris")
+    assert status == 200
+    assert payload["city"] == "london"
+    assert payload["name"] == "London"
+    assert {"temperature_celsius", "humidity", "stale"} <= payload.keys()
+
+
+def test_unknown_cities_are_not_found(server):
+    status, payload = get_json(f"{server}/weather?city=nowhere")
+    assert (status, payload["error"]) == (404, "City not found")
+
+
+def test_forecast_lists_the_days(server):
+    status, payload = get_json(f"{server}/forecast?city=london")
+    assert status == 200
+    assert payload["name"] == "London"
+    assert len(payload["days"]) == 6
+    assert {"date", "temperature_min_celsius"} <= payload["days"][0].keys()
+
+
+def test_comparison_needs_two_cities(server):
+    status, payload = get_json(f"{server}/comparison?city=london&city=paris")
+    assert status == 200
+    assert [record["name"] for record in payload["cities"]] == ["London", "Paris"]
+    assert payload["temperature_difference_celsius"] == 0
+
+    status, _ = get_json(f"{server}/comparison?city=london")
+    assert status == 400
+    status, payload = get_json(f"{server}/comparison?city=london&city=nowhere")
+    assert (status, payload["cities"]) == (404, ["nowhere"])
+
+
+def test_requests_without_a_city_or_route_are_rejected(server):
+    assert get_json(f"{server}/weather?city=%20")[0] == 400
+    assert get_json(f"{server}/weather")[0] == 400
+    assert get_json(f"{server}/radar?city=london") == (
+        404,
+        {"error": "Unknown endpoint"},
+    )
+
+
+def test_an_unreachable_upstream_is_a_bad_gateway(server, upstream, monkeypatch):
+    monkeypatch.setattr(weather_api, "MAX_RETRIES", 0)
+    upstream.failures_left = 100
+    assert get_json(f"{server}/weather?city=london") == (
+        502,
+        {"error": "Unable to connect"},
+    )
+
+
+def test_a_rate_limited_upstream_is_unavailable(server, upstream):
+    upstream.failures_left = 100
+    upstream.failure_status = 429
+    assert get_json(f"{server}/weather?city=london") == (
+        503,
+        {"error": "Rate limited by the weather service"},
+    )
+    status, _ = get_json(f"{server}/comparison?city=london&city=paris")
+    assert status == 503
+
+
+def test_metrics_are_served_as_prometheus_text(server):
+    get_json(f"{server}/weather?city=london")
+    with urlopen(f"{server}/metrics") as response:
+        assert response.headers["Content-Type"] == PROMETHEUS_CONTENT_TYPE
+        body = response.read().decode("utf-8")
+    assert 'weather_upstream_requests_total{endpoint="weather"' in body
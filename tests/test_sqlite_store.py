@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+
+from weather.sqlite_store import ConnectionPerThread, immediate_transaction
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS counts (name TEXT PRIMARY KEY, n INTEGER)"
+
+
+def test_each_thread_keeps_its_own_connection(tmp_path):
+    connections = ConnectionPerThread(str(tmp_path / "state.db"), SCHEMA)
+    assert connections.get() is connections.get()
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(connections.get()))
+    thread.start()
+    thread.join()
+    assert other[0] is not connections.get()
+
+
+def test_a_failed_transaction_is_rolled_back(tmp_path):
+    connections = ConnectionPerThread(str(tmp_path / "state.db"), SCHEMA)
+    connection = connections.get()
+    with pytest.raises(ValueError):
+        with immediate_transaction(connection):
+            connection.execute("INSERT INTO counts VALUES ('a', 1)")
+            raise ValueError
+    assert connection.execute("SELECT * FROM counts").fetchall() == []
+    assert not connection.in_transaction
+
+
+def test_commits_are_seen_by_other_connections_at_once(tmp_path):
+    path = str(tmp_path / "state.db")
+    first, second = ConnectionPerThread(path, SCHEMA), ConnectionPerThread(path, SCHEMA)
+    assert second.get().execute("SELECT * FROM counts").fetchall() == []
+    with immediate_transaction(first.get()):
+        first.get().execute("INSERT INTO counts VALUES ('a', 1)")
+    assert second.get().execute("SELECT * FROM counts").fetchall() == [("a", 1)]
@@ -0,0 +1,26 @@
+import pytest
+
+from weather import watch, weather_api
+from weather.mappings import UnitType
+
+
+def test_every_refresh_shows_a_fresh_observation(upstream, monkeypatch):
+    # The default interval is the TTL; the process outlives the watch below.
+    monkeypatch.setattr(weather_api, "CURRENT_WEATHER_TTL", 1)
+    monkeypatch.setattr(weather_api.weather_cache, "ttl", 1)
+    monkeypatch.setattr(weather_api, "_background_refresh_enabled", True)
+    results = []
+
+    def recording_iter_call_api(cities):
+        for city, result in weather_api.iter_call_api(cities):
+            results.append(result)
+            yield city, result
+        if len(results) == 4:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch, "iter_call_api", recording_iter_call_api)
+    with pytest.raises(KeyboardInterrupt):
+        watch.watch_cities(["london"], UnitType.CELSIUS, interval=1)
+
+    assert [result.stale for result in results] == [False] * 4
+    assert upstream.request_count == 4
@@ -0,0 +1,196 @@
+import sqlite3
+import time
+
+import pytest
+from typer import Abort
+
+from weather import weather_api
+from weather.mappings import STALE_KEY, Forecast, Location, Observation
+
+LONDON = Location("London", 51.5085, -0.1257)
+
+
+def weather_url(city: str) -> str:
+    return weather_api.WEATHER_SERVICE.format(
+        BASE_URL=weather_api.BASE_URL, city_name=city, API_KEY="test"
+    )
+
+
+def test_lookups_are_served_from_memory_after_the_first(upstream):
+    observation = weather_api.call_api("london")
+    assert isinstance(observation, Observation)
+    assert observation.location.name == "London"
+    assert not observation.stale
+
+    assert weather_api.call_api("  LONDON ") is observation
+    assert upstream.request_count == 1
+
+
+def test_server_errors_are_retried(upstream):
+    upstream.failures_left = 2
+    assert weather_api.call_api("london") is not None
+    assert upstream.request_count == 3
+
+
+def test_rate_limited_lookups_are_reported_without_retrying(upstream, capsys):
+    upstream.failures_left = 100
+    upstream.failure_status = 429
+    with pytest.raises(weather_api.RateLimited):
+        weather_api.call_api("london")
+    assert upstream.request_count == 1
+    assert "rate limiting" in capsys.readouterr().out
+
+
+def test_streamed_lookups_tell_rate_limiting_from_unknown_cities(upstream):
+    upstream.failures_left = 1
+    upstream.failure_status = 429
+    results = dict(weather_api.iter_call_api(["london"]))
+    assert results["london"] is weather_api.LookupFailure.RATE_LIMITED
+
+
+def test_other_upstream_errors_are_not_reported_as_unknown_cities(upstream):
+    upstream.failures_left = 100
+    upstream.failure_status = 401
+    with pytest.raises(Abort) as raised:
+        weather_api.call_api("london", compare=True)
+    assert not isinstance(raised.value, weather_api.RateLimited)
+    results = dict(weather_api.iter_call_api(["paris"]))
+    assert results["paris"] is weather_api.LookupFailure.UNREACHABLE
+
+
+def test_every_retried_attempt_takes_a_token(upstream, tmp_path, monkeypatch):
+    monkeypatch.setattr(weather_api, "API_CALLS_PER_MINUTE", 1)
+    monkeypatch.setattr(weather_api, "API_CALL_BURST", 10)
+    upstream.failures_left = 100
+    with pytest.raises(Abort):
+        weather_api.call_api("london")
+    assert upstream.request_count == weather_api.MAX_RETRIES + 1
+
+    with sqlite3.connect(tmp_path / weather_api.RATE_LIMIT_FILE) as connection:
+        (tokens,) = connection.execute("SELECT tokens FROM token_bucket").fetchone()
+    assert tokens == pytest.approx(10 - upstream.request_count, abs=0.1)
+
+
+def test_circuit_opens_and_stops_calling_the_upstream(upstream, monkeypatch):
+    monkeypatch.setattr(weather_api, "MAX_RETRIES", 0)
+    upstream.failures_left = 100
+    for city in ("paris", "oslo", "rome", "lima", "quito"):
+        with pytest.raises(Abort):
+            weather_api.call_api(city)
+    assert upstream.request_count == 5
+
+    with pytest.raises(Abort):
+        weather_api.call_api("london")
+    assert upstream.request_count == 5
+
+
+def test_recently_expired_responses_are_served_while_refreshing(upstream, monkeypatch):
+    monkeypatch.setattr(weather_api, "CURRENT_WEATHER_TTL", 1)
+    url = weather_url("london")
+    weather_api.fetch_json(url, "weather")
+    time.sleep(1.1)
+
+    response_json = weather_api.fetch_json(url, "weather")
+    assert response_json[STALE_KEY]
+    weather_api.join_refreshes(5.0)
+    assert upstream.request_count == 2
+
+    assert STALE_KEY not in weather_api.fetch_json(url, "weather")
+    assert upstream.request_count == 2
+
+
+def test_expired_responses_are_served_when_the_upstream_fails(upstream, monkeypatch):
+    monkeypatch.setattr(weather_api, "CURRENT_WEATHER_TTL", 1)
+    monkeypatch.setattr(weather_api, "STALE_WHILE_REVALIDATE", 0)
+    monkeypatch.setattr(weather_api, "MAX_RETRIES", 0)
+    weather_api.call_api("london")
+    weather_api.weather_cache.clear()
+    time.sleep(1.1)
+    upstream.failures_left = 100
+
+    observation = weather_api.call_api("london")
+    assert observation.stale
+    assert upstream.request_count == 2
+    # Stale answers are not kept in memory, so the next lookup tries again.
+    assert "london" not in weather_api.weather_cache
+
+
+def test_forecasts_are_cached_as_parsed_records(upstream):
+    forecast = weather_api.call_forecast_api(LONDON)
+    assert isinstance(forecast, Forecast)
+    assert forecast.location.name == "London"
+    assert [day.date for day in forecast.days] == [
+        "2025-09-01",
+        "2025-09-02",
+        "2025-09-03",
+        "2025-09-04",
+        "2025-09-05",
+        "2025-09-06",
+    ]
+    day = forecast.days[0]
+    assert day.temperature_min <= day.temperature_average <= day.temperature_max
+
+    assert weather_api.call_forecast_api(LONDON) is forecast
+    assert upstream.request_count == 1
+
+
+def test_batches_stream_every_city(upstream):
+    results = dict(weather_api.iter_call_api(["paris", "nowhere", "oslo"]))
+    assert results["nowhere"] is weather_api.LookupFailure.NOT_FOUND
+    assert isinstance(results["paris"], Observation)
+    assert isinstance(results["oslo"], Observation)
+
+
+@pytest.fixture
+def city_ids(monkeypatch):
+    """Give every "city <n>" the id n, and nothing else an id"""
+
+    def get_city_id(city):
+        name, _, number = city.partition(" ")
+        return int(number) if name == "city" else None
+
+    monkeypatch.setattr(weather_api, "get_city_id", get_city_id)
+
+
+def test_cities_with_ids_are_grouped_up_to_the_group_size(upstream, city_ids):
+    cities = [f"city {i}" for i in range(1, 46)]
+    cities.insert(10, "london")
+    weather_api.weather_cache.set("city 3", "cached")
+    jobs = list(weather_api.get_lookup_jobs(cities))
+
+    singles = [job[0][0] for job in jobs if job[0][1] is None]
+    groups = [[city_id for _, city_id in job] for job in jobs if job[0][1]]
+    assert singles == ["city 3", "london"]
+    assert [len(group) for group in groups] == [20, 20, 4]
+    assert sorted(sum(groups, [])) == [i for i in range(1, 46) if i != 3]
+
+
+def test_group_results_come_back_in_order_with_gaps_looked_up_alone(upstream, city_ids):
+    # The stand-in server leaves id 0 out of group responses.
+    results = weather_api.call_api_group([("city 5", 5), ("ghost", 0), ("city 7", 7)])
+    assert [city for city, _ in results] == ["city 5", "ghost", "city 7"]
+    assert [observation.location.name for _, observation in results] == [
+        "City 5",
+        "Ghost",
+        "City 7",
+    ]
+    assert upstream.request_count == 2
+    assert "city 5" in weather_api.weather_cache
+
+
+@pytest.mark.parametrize(
+    ("status", "failure"),
+    [
+        (429, weather_api.LookupFailure.RATE_LIMITED),
+        (401, weather_api.LookupFailure.UNREACHABLE),
+    ],
+)
+def test_a_failed_group_fails_every_city_without_fanning_out(
+    upstream, city_ids, status, failure
+):
+    upstream.failures_left = 100
+    upstream.failure_status = status
+    cities = [f"city {i}" for i in range(1, 6)]
+    results = dict(weather_api.iter_call_api(cities))
+    assert results == dict.fromkeys(cities, failure)
+    assert upstream.request_count == 1
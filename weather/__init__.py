@@ -0,0 +1,5 @@
+import time
+
+# Package import is the first thing `python -m weather` does; --timings
+# reports everything from here to the start of the command as "import".
+IMPORT_STARTED = time.perf_counter()
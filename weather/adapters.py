@@ -0,0 +1,74 @@
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError
+from urllib3.util.retry import Retry
+
+from .circuit_breaker import CircuitBreaker
+from .metrics import rate_limit_wait
+from .rate_limit import TokenBucket
+
+SERVER_ERROR = 500
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of sending a request while the circuit is open"""
+
+
+class RateLimitedRetry(Retry):
+    """Retry that waits for a rate limiter token before every retried attempt
+
+    urllib3 retries inside a single adapter send, so the adapter alone
+    would pay one token for up to total + 1 upstream requests.
+    """
+
+    def __init__(self, *args, rate_limiter: TokenBucket | None = None, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(*args, **kwargs)
+
+    def new(self, **kwargs):
+        kwargs.setdefault("rate_limiter", self.rate_limiter)
+        return super().new(**kwargs)
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limiter is not None:
+            rate_limit_wait.observe(self.rate_limiter.acquire())
+
+
+class UpstreamAdapter(HTTPAdapter):
+    """HTTPAdapter that guards every network round trip to the upstream
+
+    Each send first asks the circuit breaker, then waits for a token from
+    the shared rate limiter, and finally reports its outcome to the breaker.
+    Only requests that actually reach the adapter count, so cache hits cost
+    neither a token nor a breaker update. Retries happen inside the send;
+    a RateLimitedRetry makes each of them wait for a token of its own.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        rate_limiter: TokenBucket | None = None,
+        **kwargs,
+    ):
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(
+                "The circuit to the upstream is open", request=request
+            )
+        if self.rate_limiter is not None:
+            rate_limit_wait.observe(self.rate_limiter.acquire())
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        # A 429 means the upstream is up but throttling us, not failing.
+        if response.status_code >= SERVER_ERROR:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
@@ -0,0 +1,51 @@
+import time
+
+from .sqlite_store import ConnectionPerThread, immediate_transaction
+
+
+class AliasStore:
+    """Remember which city a misspelled input turned out to mean
+
+    Entries live in sqlite so every later run skips the 404 and the fuzzy
+    search. Once there are more than capacity entries, the least used ones
+    are evicted, oldest first among equals.
+    """
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self._connections = ConnectionPerThread(
+            path,
+            "CREATE TABLE IF NOT EXISTS aliases"
+            " (alias TEXT PRIMARY KEY, name TEXT NOT NULL, lat REAL NOT NULL,"
+            " lon REAL NOT NULL, hits INTEGER NOT NULL, last_used REAL NOT NULL)",
+        )
+
+    def get(self, alias: str) -> tuple[str, float, float] | None:
+        """Return the (name, lat, lon) an alias resolved to, counting the hit"""
+        connection = self._connections.get()
+        # fetchall() steps the statement to its end, which commits the update.
+        rows = connection.execute(
+            "UPDATE aliases SET hits = hits + 1, last_used = ? WHERE alias = ?"
+            " RETURNING name, lat, lon",
+            (time.time(), alias),
+        ).fetchall()
+        return rows[0] if rows else None
+
+    def set(self, alias: str, name: str, lat: float, lon: float) -> None:
+        """Remember what an alias resolved to and evict past capacity"""
+        connection = self._connections.get()
+        with immediate_transaction(connection):
+            connection.execute(
+                "INSERT INTO aliases VALUES (?, ?, ?, ?, 0, ?) ON CONFLICT (alias)"
+                " DO UPDATE SET name = excluded.name, lat = excluded.lat,"
+                " lon = excluded.lon, last_used = excluded.last_used",
+                (alias, name, lat, lon, time.time()),
+            )
+            # The new entry has no hits yet, so it is kept out of the ranking.
+            connection.execute(
+                "DELETE FROM aliases WHERE alias IN (SELECT alias FROM aliases"
+                " WHERE alias != ? ORDER BY hits DESC, last_used DESC"
+                " LIMIT -1 OFFSET ?)",
+                (alias, self.capacity - 1),
+            )
@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+import time
+
+from .sqlite_store import ConnectionPerThread, immediate_transaction
+
+
+class CircuitBreaker:
+    """Fail fast for a while once an upstream keeps failing
+
+    Calls go through while the breaker is closed. After failure_threshold
+    consecutive failures it opens and rejects calls for reset_timeout
+    seconds, then lets a single trial call through; a success closes the
+    breaker again and a failure keeps it open for another reset_timeout.
+
+    The state is kept in sqlite, so every process calling the upstream
+    shares one breaker: short CLI runs add up to the threshold together and
+    all of them fail fast once it opens. A trial whose process died before
+    reporting back is replaced by a new one after another reset_timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        path: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        name: str = "upstream",
+    ):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        # Counted per process, like every other metric.
+        self.rejections = 0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+        self._connections = ConnectionPerThread(
+            path,
+            "CREATE TABLE IF NOT EXISTS circuit_breaker"
+            " (name TEXT PRIMARY KEY, failures INTEGER NOT NULL, opened_at REAL,"
+            " trial_running INTEGER NOT NULL)",
+        )
+
+    def _read(self, connection: sqlite3.Connection) -> tuple[int, float | None, bool]:
+        row = connection.execute(
+            "SELECT failures, opened_at, trial_running FROM circuit_breaker"
+            " WHERE name = ?",
+            (self.name,),
+        ).fetchone()
+        return (0, None, False) if row is None else (row[0], row[1], bool(row[2]))
+
+    def _write(
+        self,
+        connection: sqlite3.Connection,
+        failures: int,
+        opened_at: float | None,
+        trial_running: bool,
+    ) -> None:
+        connection.execute(
+            "INSERT OR REPLACE INTO circuit_breaker VALUES (?, ?, ?, ?)",
+            (self.name, failures, opened_at, trial_running),
+        )
+
+    @property
+    def state(self) -> str:
+        _, opened_at, trial_running = self._read(self._connections.get())
+        if opened_at is None:
+            return self.CLOSED
+        return self.HALF_OPEN if trial_running else self.OPEN
+
+    def allow_request(self) -> bool:
+        """Return whether a call may go upstream right now"""
+        connection = self._connections.get()
+        # A closed breaker only needs a read, not the write lock.
+        if self._read(connection)[1] is None:
+            return True
+        with immediate_transaction(connection):
+            failures, opened_at, _ = self._read(connection)
+            now = time.time()
+            allowed = opened_at is None or now - opened_at >= self.reset_timeout
+            if opened_at is not None and allowed:
+                # The trial gets reset_timeout to report back.
+                self._write(connection, failures, now, True)
+        if not allowed:
+            with self._lock:
+                self.rejections += 1
+        return allowed
+
+    def record_success(self) -> None:
+        connection = self._connections.get()
+        if self._read(connection) == (0, None, False):
+            return
+        with immediate_transaction(connection):
+            self._write(connection, 0, None, False)
+
+    def record_failure(self) -> None:
+        opened = False
+        connection = self._connections.get()
+        with immediate_transaction(connection):
+            failures, opened_at, trial_running = self._read(connection)
+            failures += 1
+            if trial_running or failures >= self.failure_threshold:
+                opened = opened_at is None
+                opened_at = time.time()
+                trial_running = False
+            self._write(connection, failures, opened_at, trial_running)
+        if opened:
+            with self._lock:
+                self.times_opened += 1
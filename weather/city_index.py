@@ -0,0 +1,113 @@
+import heapq
+import os
+import pickle
+import tempfile
+import threading
+from array import array
+from collections import Counter
+from collections.abc import Sequence
+from pathlib import Path
+
+from .gazetteer import CITY_LIST_FILE
+
+TRIGRAM_INDEX_FILE = CITY_LIST_FILE.with_suffix(".trigrams")
+TRIGRAM_INDEX_VERSION = 1
+TRIGRAM_SIZE = 3
+MAX_FUZZY_CANDIDATES = 300
+
+_trigram_index = None
+_trigram_index_lock = threading.Lock()
+
+
+def get_trigrams(name: str) -> set[str]:
+    """Return the padded, lowercased trigrams of a city name"""
+    padded_name = f"  {name.lower().strip()} "
+    return {
+        padded_name[i : i + TRIGRAM_SIZE]
+        for i in range(len(padded_name) - TRIGRAM_SIZE + 1)
+    }
+
+
+def build_trigram_index(city_list: Sequence[str]) -> dict[str, array]:
+    """Map every trigram to the positions of the cities containing it"""
+    trigram_index = {}
+    for city_id, city_name in enumerate(city_list):
+        for trigram in get_trigrams(city_name):
+            postings = trigram_index.get(trigram)
+            if postings is None:
+                postings = trigram_index[trigram] = array("I")
+            postings.append(city_id)
+    return trigram_index
+
+
+def save_trigram_index(trigram_index: dict[str, array], path: Path) -> None:
+    """Write the trigram index to disk"""
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+    ) as file:
+        pickle.dump(
+            (TRIGRAM_INDEX_VERSION, trigram_index),
+            file,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(file.name, path)
+
+
+def load_trigram_index(path: Path) -> dict[str, array] | None:
+    """Read the trigram index from disk, or None if it is missing or outdated"""
+    try:
+        with open(path, "rb") as file:
+            version, trigram_index = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        return None
+    if version != TRIGRAM_INDEX_VERSION:
+        return None
+    return trigram_index
+
+
+def get_trigram_index(city_list: Sequence[str], source_path: Path) -> dict[str, array]:
+    """Return the trigram index, rebuilding it when the city list has changed"""
+    global _trigram_index
+    if _trigram_index is not None:
+        return _trigram_index
+
+    with _trigram_index_lock:
+        if _trigram_index is not None:
+            return _trigram_index
+        index_is_fresh = os.path.exists(TRIGRAM_INDEX_FILE) and os.path.getmtime(
+            TRIGRAM_INDEX_FILE
+        ) >= os.path.getmtime(source_path)
+        trigram_index = (
+            load_trigram_index(TRIGRAM_INDEX_FILE) if index_is_fresh else None
+        )
+        if trigram_index is None:
+            trigram_index = build_trigram_index(city_list)
+            try:
+                save_trigram_index(trigram_index, TRIGRAM_INDEX_FILE)
+            except OSError:
+                pass
+        _trigram_index = trigram_index
+    return trigram_index
+
+
+def get_candidate_ids(
+    city: str, trigram_index: dict[str, array], limit: int = MAX_FUZZY_CANDIDATES
+) -> list[int]:
+    """Return the positions of the cities sharing the most trigrams with the input
+
+    Cities tied with the last one kept are all returned, so which of them
+    make the cut never depends on iteration order.
+    """
+    shared_trigrams = Counter()
+    for trigram in sorted(get_trigrams(city)):
+        postings = trigram_index.get(trigram)
+        if postings is not None:
+            shared_trigrams.update(postings)
+    if len(shared_trigrams) > limit:
+        cutoff = heapq.nlargest(limit, shared_trigrams.values())[-1]
+    else:
+        cutoff = 0
+    return sorted(
+        (city_id for city_id, count in shared_trigrams.items() if count >= cutoff),
+        key=lambda city_id: (-shared_trigrams[city_id], city_id),
+    )
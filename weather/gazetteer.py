@@ -0,0 +1,469 @@
+import heapq
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from decouple import config
+
+CITY_LIST_FILE = Path(
+    config(
+        "CITY_LIST_FILE",
+        default=str(Path(__file__).resolve().parent.parent / "cities2.txt"),
+    )
+)
+GAZETTEER_FILE = CITY_LIST_FILE.with_suffix(".gaz")
+
+GAZETTEER_MAGIC = b"WGAZ"
+GAZETTEER_VERSION = 3
+HEADER = struct.Struct("<4sHH")
+SECTION = struct.Struct("<4sQQ")
+OFFSETS_SECTION = b"OFFS"
+NAMES_SECTION = b"NAME"
+KEYS_SECTION = b"KEYS"
+FOLDED_KEYS_SECTION = b"FKEY"
+GEONAMEIDS_SECTION = b"GEOI"
+COORDINATES_SECTION = b"COOR"
+GRID_SECTION = b"GRID"
+GRID_CITIES_SECTION = b"GCIT"
+
+# GeoNames dumps (cities500.txt, allCountries.txt, ...) are tab-separated
+# with these columns; any other file is read as one city name per line.
+GEONAMES_COLUMNS = 19
+GEONAMEID_COLUMN = 0
+NAME_COLUMN = 1
+LATITUDE_COLUMN = 4
+LONGITUDE_COLUMN = 5
+POPULATION_COLUMN = 14
+
+GRID_STEP = 0.5  # degrees of latitude and longitude per grid cell
+GRID_ROWS = int(180 / GRID_STEP)
+GRID_COLUMNS = int(360 / GRID_STEP)
+EARTH_RADIUS_KM = 6371.0088
+# Letters that casefold and NFKD leave alone but nobody expects to type.
+FOLDED_LETTERS = str.maketrans(
+    {
+        "æ": "ae",
+        "đ": "d",
+        "ð": "d",
+        "ħ": "h",
+        "ı": "i",
+        "ł": "l",
+        "ø": "o",
+        "œ": "oe",
+        "þ": "th",
+    }
+)
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+class GazetteerError(Exception):
+    pass
+
+
+def name_key(name: str) -> str:
+    """Collapse case and whitespace so a typed city name matches its entry"""
+    return " ".join(name.split()).casefold()
+
+
+def fold_name(name: str) -> str:
+    """Drop accents and punctuation so a city name can be typed on any keyboard
+
+    Dashes and spaces become single spaces; other punctuation and symbols
+    disappear, so "‘Ayn Ḩalāqīm" folds to "ayn halaqim".
+    """
+    characters = []
+    for character in unicodedata.normalize("NFKD", name):
+        category = unicodedata.category(character)
+        if category[0] in "LN":
+            characters.append(character)
+        elif category == "Pd" or character.isspace():
+            characters.append(" ")
+    return " ".join("".join(characters).casefold().translate(FOLDED_LETTERS).split())
+
+
+def get_grid_cell(lat: float, lon: float) -> int:
+    """Return the grid cell containing the coordinates"""
+    row = min(GRID_ROWS - 1, max(0, math.floor((lat + 90) / GRID_STEP)))
+    column = math.floor((lon + 180) / GRID_STEP) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def get_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def get_column_span(lat: float, row_span: int) -> int:
+    """Columns to scan either side so the box is about as wide as it is tall"""
+    poleward_edge = abs(lat) + (row_span + 1) * GRID_STEP
+    if poleward_edge >= 90:
+        return GRID_COLUMNS // 2
+    return min(
+        GRID_COLUMNS // 2, math.ceil(row_span / math.cos(math.radians(poleward_edge)))
+    )
+
+
+def get_box_columns(column: int, column_span: int) -> range:
+    if 2 * column_span + 1 >= GRID_COLUMNS:
+        return range(column - GRID_COLUMNS // 2, column + GRID_COLUMNS // 2)
+    return range(column - column_span, column + column_span + 1)
+
+
+def get_new_cells(
+    row: int, column: int, previous_spans: tuple | None, spans: tuple[int, int]
+):
+    """Yield the cells of a box around (row, column) not in the previous box"""
+    row_span, column_span = spans
+    columns = get_box_columns(column, column_span)
+    if previous_spans is None:
+        previous_rows = range(0)
+        new_columns = ()
+    else:
+        previous_rows = range(row - previous_spans[0], row + previous_spans[0] + 1)
+        previous_columns = get_box_columns(column, previous_spans[1])
+        new_columns = (
+            *range(columns.start, previous_columns.start),
+            *range(previous_columns.stop, columns.stop),
+        )
+    for cell_row in range(max(0, row - row_span), min(GRID_ROWS, row + row_span + 1)):
+        for cell_column in columns if cell_row not in previous_rows else new_columns:
+            yield cell_row * GRID_COLUMNS + cell_column % GRID_COLUMNS
+
+
+def get_box_bound_km(
+    lat: float, lon: float, row: int, column: int, spans: tuple[int, int]
+) -> float:
+    """Lower bound on the distance from the point to anything outside the box"""
+    row_span, column_span = spans
+    bounds = []
+    south_edge = (row - row_span) * GRID_STEP - 90
+    north_edge = (row + row_span + 1) * GRID_STEP - 90
+    if south_edge > -90:
+        bounds.append(math.radians(lat - south_edge) * EARTH_RADIUS_KM)
+    if north_edge < 90:
+        bounds.append(math.radians(north_edge - lat) * EARTH_RADIUS_KM)
+    if 2 * column_span + 1 < GRID_COLUMNS:
+        west_edge = (column - column_span) * GRID_STEP - 180
+        east_edge = (column + column_span + 1) * GRID_STEP - 180
+        degrees = min(90.0, lon - west_edge, east_edge - lon)
+        # Shortest way from the point to a meridian that many degrees away.
+        bounds.append(
+            EARTH_RADIUS_KM
+            * math.asin(math.sin(math.radians(degrees)) * math.cos(math.radians(lat)))
+        )
+    return min(bounds, default=math.inf)
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _write_sections(destination: Path, sections: dict[bytes, bytes]) -> None:
+    """Write the header, section table and section payloads to disk"""
+    offset = HEADER.size + SECTION.size * len(sections)
+    # A unique name per call, so concurrent compiles never share a file.
+    with tempfile.NamedTemporaryFile(
+        dir=destination.parent,
+        prefix=f"{destination.name}.",
+        suffix=".tmp",
+        delete=False,
+    ) as file:
+        file.write(HEADER.pack(GAZETTEER_MAGIC, GAZETTEER_VERSION, len(sections)))
+        for tag, payload in sections.items():
+            file.write(SECTION.pack(tag, offset, len(payload)))
+            offset += len(payload)
+        for payload in sections.values():
+            file.write(payload)
+    os.replace(file.name, destination)
+
+
+def read_city_list(source: Path) -> tuple[list[str], list[tuple] | None]:
+    """Return the city names, plus (geonameid, lat, lon, population) for GeoNames"""
+    names = []
+    rows = []
+    with open(source, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < GEONAMES_COLUMNS:
+                names.append(line.rstrip())
+                continue
+            try:
+                rows.append(
+                    (
+                        int(fields[GEONAMEID_COLUMN]),
+                        float(fields[LATITUDE_COLUMN]),
+                        float(fields[LONGITUDE_COLUMN]),
+                        int(fields[POPULATION_COLUMN] or 0),
+                    )
+                )
+            except ValueError:
+                raise GazetteerError(f"{source}:{line_number} is not a GeoNames row")
+            names.append(fields[NAME_COLUMN].strip())
+    if rows and len(rows) != len(names):
+        raise GazetteerError(f"{source} mixes GeoNames rows with plain city names")
+    return names, rows or None
+
+
+def _get_coordinate_sections(rows: list[tuple]) -> dict[bytes, bytes]:
+    """Pack the GeoNames ids, coordinates and a fixed grid over them"""
+    geonameids = array("I", (row[0] for row in rows))
+    coordinates = array("f")
+    cells = [[] for _ in range(GRID_ROWS * GRID_COLUMNS)]
+    for city_id, (_, lat, lon, _) in enumerate(rows):
+        coordinates.extend((lat, lon))
+        cells[get_grid_cell(lat, lon)].append(city_id)
+    grid = array("I", [0])
+    grid_cities = array("I")
+    for cell in cells:
+        grid_cities.extend(cell)
+        grid.append(len(grid_cities))
+    return {
+        GEONAMEIDS_SECTION: _to_little_endian(geonameids),
+        COORDINATES_SECTION: _to_little_endian(coordinates),
+        GRID_SECTION: _to_little_endian(grid),
+        GRID_CITIES_SECTION: _to_little_endian(grid_cities),
+    }
+
+
+def compile_gazetteer(
+    source: Path = CITY_LIST_FILE, destination: Path = GAZETTEER_FILE
+) -> int:
+    """Pack the city list into an offset table plus a UTF-8 name blob
+
+    A GeoNames dump additionally stores each city's geonameid, coordinates
+    and a grid index for nearest-city queries. Cities sharing a name are
+    keyed most populous first, so an exact lookup picks the likely one.
+    A second ordering by folded name serves prefix completion.
+    """
+    names, rows = read_city_list(source)
+    offsets = array("I", [0])
+    name_blob = bytearray()
+    for city_name in names:
+        name_blob += city_name.encode("utf-8")
+        offsets.append(len(name_blob))
+    populations = [row[3] for row in rows] if rows else [0] * len(names)
+    keys = array(
+        "I",
+        sorted(
+            range(len(names)),
+            key=lambda city_id: (name_key(names[city_id]), -populations[city_id]),
+        ),
+    )
+    folded_names = [fold_name(city_name) for city_name in names]
+    folded_keys = array(
+        "I",
+        sorted(
+            range(len(names)),
+            key=lambda city_id: (folded_names[city_id], -populations[city_id]),
+        ),
+    )
+    sections = {
+        OFFSETS_SECTION: _to_little_endian(offsets),
+        NAMES_SECTION: bytes(name_blob),
+        KEYS_SECTION: _to_little_endian(keys),
+        FOLDED_KEYS_SECTION: _to_little_endian(folded_keys),
+    }
+    if rows:
+        sections.update(_get_coordinate_sections(rows))
+    _write_sections(destination, sections)
+    return len(names)
+
+
+class Gazetteer:
+    """Read-only, memory-mapped view over a compiled city list"""
+
+    def __init__(self, path: Path = GAZETTEER_FILE):
+        self.path = Path(path)
+        self._mmap = None
+        self._offsets = None
+        self._names = None
+        self._keys = None
+        self._folded_keys = None
+        self._geonameids = None
+        self._coordinates = None
+        self._grid = None
+        self._grid_cities = None
+
+    def open(self) -> None:
+        """Map the gazetteer file and read its section table"""
+        with open(self.path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, section_count = HEADER.unpack_from(self._mmap, 0)
+        if magic != GAZETTEER_MAGIC or version != GAZETTEER_VERSION:
+            self._mmap.close()
+            self._mmap = None
+            raise GazetteerError(f"{self.path} is not a compatible gazetteer")
+        sections = {}
+        for i in range(section_count):
+            tag, offset, length = SECTION.unpack_from(
+                self._mmap, HEADER.size + i * SECTION.size
+            )
+            sections[tag] = memoryview(self._mmap)[offset : offset + length]
+        self._offsets = self._load_array(sections[OFFSETS_SECTION], "I")
+        self._names = sections[NAMES_SECTION]
+        self._keys = self._load_array(sections[KEYS_SECTION], "I")
+        self._folded_keys = self._load_array(sections[FOLDED_KEYS_SECTION], "I")
+        if COORDINATES_SECTION in sections:
+            self._geonameids = self._load_array(sections[GEONAMEIDS_SECTION], "I")
+            self._coordinates = self._load_array(sections[COORDINATES_SECTION], "f")
+            self._grid = self._load_array(sections[GRID_SECTION], "I")
+            self._grid_cities = self._load_array(sections[GRID_CITIES_SECTION], "I")
+
+    @staticmethod
+    def _load_array(section: memoryview, typecode: str):
+        if sys.byteorder == "little":
+            return section.cast(typecode)
+        values = array(typecode, section.tobytes())
+        values.byteswap()
+        return values
+
+    @property
+    def offsets(self):
+        if self._mmap is None:
+            self.open()
+        return self._offsets
+
+    @property
+    def keys(self):
+        """City ids ordered by name key"""
+        if self._mmap is None:
+            self.open()
+        return self._keys
+
+    @property
+    def folded_keys(self):
+        """City ids ordered by folded name"""
+        if self._mmap is None:
+            self.open()
+        return self._folded_keys
+
+    @property
+    def has_coordinates(self) -> bool:
+        if self._mmap is None:
+            self.open()
+        return self._coordinates is not None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, city_id: int) -> str:
+        offsets = self.offsets
+        return str(self._names[offsets[city_id] : offsets[city_id + 1]], "utf-8")
+
+    def __iter__(self):
+        for city_id in range(len(self)):
+            yield self[city_id]
+
+    def find(self, city_name: str) -> int | None:
+        """Return the id of the city with exactly this name, or None"""
+        key = name_key(city_name)
+        keys = self.keys
+        position = bisect_left(keys, key, key=lambda city_id: name_key(self[city_id]))
+        if position < len(keys) and name_key(self[keys[position]]) == key:
+            return keys[position]
+        return None
+
+    def complete(self, prefix: str, limit: int) -> list[str]:
+        """Return up to limit distinct names whose folded form starts with prefix"""
+        folded_prefix = fold_name(prefix)
+        keys = self.folded_keys
+        position = bisect_left(
+            keys, folded_prefix, key=lambda city_id: fold_name(self[city_id])
+        )
+        names = {}
+        for position in range(position, len(keys)):
+            city_name = self[keys[position]]
+            if len(names) == limit or not fold_name(city_name).startswith(
+                folded_prefix
+            ):
+                break
+            names[city_name] = None
+        return list(names)
+
+    def geonameid(self, city_id: int) -> int | None:
+        if not self.has_coordinates:
+            return None
+        return self._geonameids[city_id]
+
+    def coordinates(self, city_id: int) -> tuple[float, float] | None:
+        if not self.has_coordinates:
+            return None
+        return self._coordinates[2 * city_id], self._coordinates[2 * city_id + 1]
+
+    def nearest(self, lat: float, lon: float, count: int) -> list[tuple[float, int]]:
+        """Return (distance in km, city id) of the count cities closest to a point
+
+        Grid cells are scanned in growing boxes around the point, widened in
+        longitude towards the poles so they stay roughly square on the ground,
+        until nothing outside the box can beat the count-th best match.
+        """
+        if not self.has_coordinates or count < 1:
+            return []
+        lon = (lon + 180) % 360 - 180
+        row, column = divmod(get_grid_cell(lat, lon), GRID_COLUMNS)
+        best = []  # max-heap of (-distance, city id)
+        previous_spans = None
+        for ring in range(GRID_ROWS + 1):
+            spans = (ring, get_column_span(lat, ring))
+            for cell in get_new_cells(row, column, previous_spans, spans):
+                for city_id in self._grid_cities[
+                    self._grid[cell] : self._grid[cell + 1]
+                ]:
+                    distance = get_distance_km(lat, lon, *self.coordinates(city_id))
+                    if len(best) < count:
+                        heapq.heappush(best, (-distance, city_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, city_id))
+            if len(best) == count and -best[0][0] <= get_box_bound_km(
+                lat, lon, row, column, spans
+            ):
+                break
+            previous_spans = spans
+        return sorted((-distance, city_id) for distance, city_id in best)
+
+
+def gazetteer_is_outdated(
+    source: Path = CITY_LIST_FILE, destination: Path = GAZETTEER_FILE
+) -> bool:
+    """Check whether the compiled gazetteer is missing or older than the city list"""
+    if not destination.exists():
+        return True
+    return source.exists() and source.stat().st_mtime > destination.stat().st_mtime
+
+
+def get_gazetteer() -> Gazetteer:
+    """Return the shared gazetteer, compiling it first if needed"""
+    global _gazetteer
+    if _gazetteer is not None:
+        return _gazetteer
+    # Lookups run in worker threads; only the first one may compile.
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            if gazetteer_is_outdated():
+                compile_gazetteer()
+            gazetteer = Gazetteer()
+            try:
+                gazetteer.open()
+            except GazetteerError:
+                compile_gazetteer()
+                gazetteer = Gazetteer()
+            _gazetteer = gazetteer
+    return _gazetteer
@@ -0,0 +1,142 @@
+import math
+import mmap
+import os
+import struct
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+from .gazetteer import fold_name
+from .mappings import COORDINATE_PRECISION, Location, Observation
+
+# Observation time (unix seconds), temperature (K), humidity (%), wind speed (m/s)
+RECORD = struct.Struct("<qfff")
+HISTORY_SUFFIX = ".obs"
+# Where Windows takes its lock; a city would need 2**26 records to reach it.
+LOCK_OFFSET = 2**30
+
+
+def get_history_key(city_name: str) -> str:
+    """Return the folded name history files of a city start with"""
+    return fold_name(city_name).replace(" ", "_")
+
+
+def get_history_path(directory: Path, location: Location) -> Path | None:
+    """Return the history file of a place, named after its folded name and coordinates
+
+    The rounded coordinates keep places that share a name, like the many
+    Springfields, in files of their own.
+    """
+    key = get_history_key(location.name)
+    if not key:
+        return None
+    precision = COORDINATE_PRECISION
+    coordinates = f"{location.lat:.{precision}f},{location.lon:.{precision}f}"
+    return directory / f"{key}@{coordinates}{HISTORY_SUFFIX}"
+
+
+def find_history_paths(directory: Path, city_name: str) -> dict[str, Path]:
+    """Return the history file of every recorded place with a name, by coordinates"""
+    key = get_history_key(city_name)
+    if not key:
+        return {}
+    return {
+        path.stem.partition("@")[2]: path
+        for path in sorted(directory.glob(f"{key}@*{HISTORY_SUFFIX}"))
+    }
+
+
+def lock_file(fd: int) -> None:
+    """Block until this process holds the file's lock, released on close"""
+    try:
+        import fcntl
+    except ImportError:
+        # Windows locks are mandatory, so lock a byte far past any record
+        # rather than one that readers of the history might need.
+        import msvcrt
+
+        os.lseek(fd, LOCK_OFFSET, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        return
+    fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def append_observation(directory: Path, observation: Observation) -> bool:
+    """Append a current weather observation to its city's history
+
+    Only observations newer than the last stored one are written, so cache
+    hits and stale responses are skipped and every file stays sorted by
+    time. The check and the write happen under an exclusive lock on the
+    file, so concurrent processes cannot interleave them. Returns whether a
+    record was appended.
+    """
+    path = get_history_path(directory, observation.location)
+    if path is None:
+        return False
+    directory.mkdir(parents=True, exist_ok=True)
+    record = RECORD.pack(
+        observation.observed,
+        observation.temperature,
+        observation.humidity,
+        observation.wind_speed,
+    )
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        # Without the lock two processes can both read the same last record
+        # and append out of order, which breaks the binary search.
+        lock_file(fd)
+        size = os.fstat(fd).st_size
+        if size % RECORD.size:
+            # A write cut short by a crash; drop it so records stay aligned.
+            size -= size % RECORD.size
+            os.ftruncate(fd, size)
+        if size:
+            os.lseek(fd, size - RECORD.size, os.SEEK_SET)
+            last_observed = RECORD.unpack(os.read(fd, RECORD.size))[0]
+            if observation.observed <= last_observed:
+                return False
+        os.write(fd, record)
+    finally:
+        os.close(fd)
+    return True
+
+
+def summarize_history(path: Path, since: float, until: float) -> dict | None:
+    """Return temperature statistics of the observations between two times
+
+    The range is found by binary search on the memory-mapped file, so only
+    the records inside it are read. Returns None when there are none.
+    """
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with file:
+        count = os.fstat(file.fileno()).st_size // RECORD.size
+        if count == 0:
+            return None
+        with mmap.mmap(
+            file.fileno(), count * RECORD.size, access=mmap.ACCESS_READ
+        ) as data:
+
+            def observed(index: int) -> int:
+                return RECORD.unpack_from(data, index * RECORD.size)[0]
+
+            start = bisect_left(range(count), since, key=observed)
+            stop = bisect_right(range(count), until, key=observed)
+            if start >= stop:
+                return None
+            temperatures = [
+                temperature
+                for _, temperature, _, _ in RECORD.iter_unpack(
+                    data[start * RECORD.size : stop * RECORD.size]
+                )
+            ]
+            first_observed, last_observed = observed(start), observed(stop - 1)
+    return {
+        "observations": len(temperatures),
+        "first_observed": first_observed,
+        "last_observed": last_observed,
+        "temperature_min": min(temperatures),
+        "temperature_max": max(temperatures),
+        "temperature_mean": math.fsum(temperatures) / len(temperatures),
+    }
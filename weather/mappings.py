@@ -1,12 +1,23 @@
+import heapq
 from collections import Counter
-from datetime import datetime, timedelta
-from difflib import get_close_matches
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from difflib import SequenceMatcher
 from enum import StrEnum
 
-CURRENT_DAY = datetime.now()
-FIVE_DAYS = 5
-DATE_INDEX = 10
+from .city_index import get_candidate_ids, get_trigram_index
+from .gazetteer import GAZETTEER_FILE, Gazetteer, get_gazetteer
+from .timings import timed
+
 INVALID_WIND_DIRECTION = "(Invalid wind direction)"
+# Marks a response served from cache.db after it expired.
+STALE_KEY = "stale"
+# Decimal places of the coordinates that nearby lookups share, about 1km.
+COORDINATE_PRECISION = 2
+# The same limits difflib.get_close_matches uses by default.
+FUZZY_MATCH_LIMIT = 3
+FUZZY_MATCH_CUTOFF = 0.6
 
 WEATHERS = {
     "Clear": "sunny",
@@ -62,17 +73,103 @@ class Comparison_Feature(StrEnum):
     TEMPERATURE = "t"
 
 
+class Ranking_Feature(StrEnum):
+    TEMPERATURE = "t"
+    HUMIDITY = "h"
+    WIND_SPEED = "w"
+
+
+RANKING_KEYS = {
+    Ranking_Feature.TEMPERATURE: "temperature_celsius",
+    Ranking_Feature.HUMIDITY: "humidity",
+    Ranking_Feature.WIND_SPEED: "wind_speed",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Location:
+    name: str
+    lat: float
+    lon: float
+
+
+@dataclass(frozen=True, slots=True)
+class Observation:
+    """Current weather of one city, temperatures in Kelvin as the API sends them"""
+
+    location: Location
+    observed: int
+    weather_status: str
+    weather_description: str
+    temperature: float
+    humidity: int
+    wind_speed: float
+    wind_direction: int
+    stale: bool = False
+
+    @property
+    def temperature_celsius(self) -> float:
+        return from_kelvin_convert_to_celsius(self.temperature)
+
+
+@dataclass(frozen=True, slots=True)
+class DailyForecast:
+    """Most common weather and temperature range of one forecast date, in Kelvin"""
+
+    date: str
+    weather_status: str
+    temperature_min: float
+    temperature_max: float
+    temperature_average: float
+
+
+@dataclass(frozen=True, slots=True)
+class Forecast:
+    """Daily forecasts of one place, parsed once when the response arrives"""
+
+    location: Location
+    days: tuple[DailyForecast, ...]
+    stale: bool = False
+
+
 class forecast_day:
-    def __init__(self):
-        self.temperatures = []
+    """Running temperature and weather statistics of one forecast date"""
+
+    __slots__ = (
+        "date",
+        "temperature_min",
+        "temperature_max",
+        "temperature_total",
+        "forecast_weather_counter",
+        "entry_numbers",
+    )
+
+    def __init__(self, date: str):
+        self.date = date
+        self.temperature_min = float("inf")
+        self.temperature_max = float("-inf")
+        self.temperature_total = 0.0
         self.forecast_weather_counter = Counter()
         self.entry_numbers = 0
 
-    def update_forecast_info(self, weather_count: list[str], temperature: float):
-        self.temperatures.append(temperature)
-        self.forecast_weather_counter.update(weather_count)
+    def update_forecast_info(self, weather: str, temperature: float):
+        if temperature < self.temperature_min:
+            self.temperature_min = temperature
+        if temperature > self.temperature_max:
+            self.temperature_max = temperature
+        self.temperature_total += temperature
+        self.forecast_weather_counter[weather] += 1
         self.entry_numbers += 1
 
+    def to_daily_forecast(self) -> DailyForecast:
+        return DailyForecast(
+            date=self.date,
+            weather_status=self.forecast_weather_counter.most_common(1)[0][0],
+            temperature_min=self.temperature_min,
+            temperature_max=self.temperature_max,
+            temperature_average=self.temperature_total / self.entry_numbers,
+        )
+
 
 def from_kelvin_convert_to_celsius(temperature: float) -> float:
     return temperature - 273.15
@@ -95,69 +192,156 @@ def get_wind_direction(angle: int) -> str:
     return INVALID_WIND_DIRECTION
 
 
-def get_weather_descriptions(response) -> dict:
-    """Return a tidy information dictionary from the response"""
+@timed("parse_observation")
+def parse_observation(response) -> Observation:
+    """Project a successful current weather response onto an Observation"""
+    weather = response["weather"][0]
+    main = response["main"]
+    wind = response["wind"]
+    return Observation(
+        location=Location(
+            name=response["name"],
+            lat=response["coord"]["lat"],
+            lon=response["coord"]["lon"],
+        ),
+        observed=response["dt"],
+        weather_status=weather["main"],
+        weather_description=weather["description"],
+        temperature=main["temp"],
+        humidity=main["humidity"],
+        wind_speed=wind["speed"],
+        wind_direction=wind["deg"],
+        stale=response.get(STALE_KEY, False),
+    )
+
+
+def get_weather_descriptions(observation: Observation) -> dict:
+    """Return a tidy information dictionary from the observation"""
+    return {
+        "weather_status": observation.weather_status,
+        "weather_description": observation.weather_description.capitalize(),
+        "temperature_celsius": observation.temperature_celsius,
+        "humidity": observation.humidity,
+        "wind_speed": observation.wind_speed,
+        "wind_direction": observation.wind_direction,
+        "stale": observation.stale,
+    }
+
+
+def get_weather_record(city: str, observation: Observation) -> dict:
+    """Return the searched city, its canonical name and its weather descriptions"""
     return {
-        "weather_status": response["weather"][0]["main"],
-        "weather_description": response["weather"][0]["description"].capitalize(),
-        "temperature_celsius": from_kelvin_convert_to_celsius(response["main"]["temp"]),
-        "humidity": response["main"]["humidity"],
-        "wind_speed": response["wind"]["speed"],
-        "wind_direction": response["wind"]["deg"],
+        "city": city,
+        "name": observation.location.name,
+        **get_weather_descriptions(observation),
     }
 
 
-def get_all_cities() -> list[str]:
-    """Store all city name into a list"""
-    city_list = []
-    with open("cities2.txt", "r", encoding="utf-8") as file:
-        for city_name in file:
-            city_list.append(city_name.rstrip())
-    return city_list
+def get_all_cities() -> Gazetteer:
+    """Return every city name from the compiled gazetteer"""
+    return get_gazetteer()
+
+
+@dataclass(frozen=True, slots=True)
+class CityMatch:
+    name: str
+    score: float
+
+
+@timed("fuzzy_search")
+def rank_city_matches(city: str, limit: int = FUZZY_MATCH_LIMIT) -> list[CityMatch]:
+    """Return the closest city names to the search input, best match first"""
+    city_list = get_all_cities()
+    trigram_index = get_trigram_index(city_list, GAZETTEER_FILE)
+    matcher = SequenceMatcher()
+    matcher.set_seq2(city)
+    scores = {}
+    for i in get_candidate_ids(city, trigram_index):
+        # Many places share a name; the API can only be asked for it once.
+        if city_list[i] in scores:
+            continue
+        matcher.set_seq1(city_list[i])
+        # The cheap upper bounds rule most candidates out before ratio() runs.
+        if (
+            matcher.real_quick_ratio() < FUZZY_MATCH_CUTOFF
+            or matcher.quick_ratio() < FUZZY_MATCH_CUTOFF
+        ):
+            continue
+        scores[city_list[i]] = matcher.ratio()
+    scored = [
+        (score, name) for name, score in scores.items() if score >= FUZZY_MATCH_CUTOFF
+    ]
+    return [CityMatch(name, score) for score, name in heapq.nlargest(limit, scored)]
+
+
+def pick_city_match(matches: list[CityMatch], threshold: float) -> CityMatch | None:
+    """Return the best match if it clears the threshold and beats the runner-up"""
+    if not matches or matches[0].score < threshold:
+        return None
+    if len(matches) > 1 and matches[1].score == matches[0].score:
+        return None
+    return matches[0]
 
 
 def fuzzy_search(city: str) -> list[str]:
     """Return a list of city names that is close to search input"""
-    new_search = get_close_matches(city, get_all_cities())
+    new_search = rank_city_matches(city)
     if len(new_search) < 1:
         return None
     else:
-        return new_search
+        return [match.name for match in new_search]
 
 
-def get_five_days_for_forecast():
-    five_days_list = []
-    for i in range(0, FIVE_DAYS):
-        five_days_list.append(str(CURRENT_DAY + timedelta(days=i))[:DATE_INDEX])
-    return five_days_list
+def get_city_timezone(forecast_response) -> timezone:
+    """Return the forecast city's fixed UTC offset"""
+    return timezone(timedelta(seconds=forecast_response["city"].get("timezone", 0)))
 
 
-def parse_forecast_response(forecast_response, five_days_list) -> list[forecast_day]:
-    """Separate the response into five days"""
-    first_day = forecast_day()
-    second_day = forecast_day()
-    third_day = forecast_day()
-    fourth_day = forecast_day()
-    fifth_day = forecast_day()
+@timed("parse_forecast_response")
+def parse_forecast_response(forecast_response) -> list[DailyForecast]:
+    """Group the 3-hourly forecast entries by the city's local date in a single pass"""
+    city_timezone = get_city_timezone(forecast_response)
+    forecast_days = {}
     for forecast_info in forecast_response["list"]:
-        if forecast_info["dt_txt"][:DATE_INDEX] == five_days_list[0]:
-            first_day.update_forecast_info(
-                [forecast_info["weather"][0]["main"]], forecast_info["main"]["temp"]
-            )
-        elif forecast_info["dt_txt"][:DATE_INDEX] == five_days_list[1]:
-            second_day.update_forecast_info(
-                [forecast_info["weather"][0]["main"]], forecast_info["main"]["temp"]
-            )
-        elif forecast_info["dt_txt"][:DATE_INDEX] == five_days_list[2]:
-            third_day.update_forecast_info(
-                [forecast_info["weather"][0]["main"]], forecast_info["main"]["temp"]
-            )
-        elif forecast_info["dt_txt"][:DATE_INDEX] == five_days_list[3]:
-            fourth_day.update_forecast_info(
-                [forecast_info["weather"][0]["main"]], forecast_info["main"]["temp"]
-            )
-        elif forecast_info["dt_txt"][:DATE_INDEX] == five_days_list[4]:
-            fifth_day.update_forecast_info(
-                [forecast_info["weather"][0]["main"]], forecast_info["main"]["temp"]
-            )
-    return [first_day, second_day, third_day, fourth_day, fifth_day]
+        date = datetime.fromtimestamp(forecast_info["dt"], city_timezone).strftime(
+            "%Y-%m-%d"
+        )
+        day = forecast_days.get(date)
+        if day is None:
+            day = forecast_days[date] = forecast_day(date)
+        day.update_forecast_info(
+            forecast_info["weather"][0]["main"], forecast_info["main"]["temp"]
+        )
+    return [day.to_daily_forecast() for day in forecast_days.values()]
+
+
+def parse_forecast(forecast_response) -> Forecast:
+    """Project a successful forecast response onto a Forecast"""
+    city = forecast_response["city"]
+    return Forecast(
+        location=Location(
+            name=city["name"], lat=city["coord"]["lat"], lon=city["coord"]["lon"]
+        ),
+        days=tuple(parse_forecast_response(forecast_response)),
+        stale=forecast_response.get(STALE_KEY, False),
+    )
+
+
+def get_forecast_records(forecast_days: Iterable[DailyForecast]) -> list[dict]:
+    """Return a plain dictionary per forecast day, temperatures in Celsius"""
+    return [
+        {
+            "date": day.date,
+            "weather_status": day.weather_status,
+            "temperature_min_celsius": from_kelvin_convert_to_celsius(
+                day.temperature_min
+            ),
+            "temperature_max_celsius": from_kelvin_convert_to_celsius(
+                day.temperature_max
+            ),
+            "temperature_average_celsius": from_kelvin_convert_to_celsius(
+                day.temperature_average
+            ),
+        }
+        for day in forecast_days
+    ]
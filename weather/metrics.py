@@ -0,0 +1,182 @@
+import math
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(label_names: tuple[str, ...], label_values: tuple) -> str:
+    """Render label pairs the way the Prometheus text format expects"""
+    if not label_names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{escape_label_value(value)}"'
+        for name, value in zip(label_names, label_values)
+    )
+    return "{" + pairs + "}"
+
+
+def format_value(value: float) -> str:
+    """Render a sample value exactly; counts stay integers"""
+    if isinstance(value, int):
+        return str(int(value))
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class Counter:
+    """Monotonic count, optionally split by a fixed set of labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name, format_labels(self.label_names, label_values), value
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, optionally labelled"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                ]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = sorted(
+                (label_values, (list(counts), total))
+                for label_values, (counts, total) in self._series.items()
+            )
+        label_names = (*self.label_names, "le")
+        for label_values, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = format_labels(label_names, (*label_values, bound))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    """Every metric of the process, rendered in the Prometheus text format
+
+    Collectors are callables returning (name, kind, help, label names,
+    {label values: value}) for numbers that already live elsewhere, such as
+    the in-memory cache counters; they are read only when rendering.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str, label_names=()) -> Counter:
+        metric = Counter(name, help_text, tuple(label_names))
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names=()) -> Histogram:
+        metric = Histogram(name, help_text, tuple(label_names))
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {format_value(value)}")
+        for collector in self._collectors:
+            for name, kind, help_text, label_names, values in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for label_values, value in values.items():
+                    labels = format_labels(label_names, label_values)
+                    lines.append(f"{name}{labels} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+upstream_requests = registry.counter(
+    "weather_upstream_requests_total",
+    "Requests made through the HTTP session, by endpoint, source and status",
+    ("endpoint", "source", "status"),
+)
+upstream_latency = registry.histogram(
+    "weather_upstream_latency_seconds",
+    "Time spent in the HTTP session per request, by endpoint and source",
+    ("endpoint", "source"),
+)
+fuzzy_fallbacks = registry.counter(
+    "weather_fuzzy_fallbacks_total",
+    "City-not-found responses that fell back to the fuzzy search, by outcome",
+    ("outcome",),
+)
+alias_lookups = registry.counter(
+    "weather_alias_lookups_total",
+    "Lookups of misspelled cities in the persistent alias store, by outcome",
+    ("outcome",),
+)
+rate_limit_wait = registry.histogram(
+    "weather_rate_limit_wait_seconds",
+    "Time each upstream request queued for a token of the shared rate limiter",
+)
+
+
+def write_metrics(path: str) -> None:
+    """Dump the current metrics to a file, e.g. for node_exporter's textfile"""
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(registry.render())
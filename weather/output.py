@@ -1,69 +1,87 @@
+import json
+import sys
+from collections.abc import Iterable
+from datetime import datetime
+
 from rich.console import Console
 
 from .mappings import (
     WEATHERS,
+    DailyForecast,
+    Observation,
     UnitType,
     from_celsius_convert_to_fahrenheit,
-    get_weather_descriptions,
+    from_kelvin_convert_to_celsius,
     get_wind_direction,
 )
+from .timings import timed
 
 console = Console()
 
 
-def print_weather_descriptions(response, city_name: str, unit_preference: str) -> None:
+@timed("output.print_weather_descriptions")
+def print_weather_descriptions(observation: Observation, unit_preference: str) -> None:
     """Printing weather descriptions(weather, temperature and humidity)"""
-    weather_descriptions = get_weather_descriptions(response)
     console.print()
     console.print(
-        f"{city_name.title().strip()} is {WEATHERS[weather_descriptions['weather_status']]} today. ({weather_descriptions['weather_description']})"
+        f"{observation.location.name} is {WEATHERS[observation.weather_status]} today. ({observation.weather_description.capitalize()})"
     )
     if unit_preference == "f":
         temperature_fahrenheit = from_celsius_convert_to_fahrenheit(
-            float(weather_descriptions["temperature_celsius"])
+            observation.temperature_celsius
         )
 
         console.print(f"Temperature: {temperature_fahrenheit:.2f}[bold cyan]°F[/]")
     else:
         console.print(
-            f"Temperature: {weather_descriptions['temperature_celsius']:.2f}[bold cyan]°C[/]"
+            f"Temperature: {observation.temperature_celsius:.2f}[bold cyan]°C[/]"
         )
-    console.print(f"Humidity: {weather_descriptions['humidity']}[bold cyan]%[/]")
+    console.print(f"Humidity: {observation.humidity}[bold cyan]%[/]")
     console.print(
-        f"Wind speed: [bold cyan]{weather_descriptions['wind_speed']}m/s[/] (Direction: [bold cyan]{get_wind_direction(weather_descriptions['wind_direction'])}[/])"
+        f"Wind speed: [bold cyan]{observation.wind_speed}m/s[/] (Direction: [bold cyan]{get_wind_direction(observation.wind_direction)}[/])"
     )
+    if observation.stale:
+        print_stale_notice("weather", observation.observed)
+
 
+def print_stale_notice(subject: str, observed: int | None = None) -> None:
+    """Warn that the shown data came from an expired cache entry"""
+    when = f" observed at {datetime.fromtimestamp(observed):%H:%M}" if observed else ""
+    console.print(f"[yellow]Showing cached {subject}{when}; it may be out of date.[/]")
 
+
+@timed("output.print_compared_weather")
 def print_compared_weather(
     first_city_name: str,
-    first_city_info: dict,
+    first_city_info: Observation,
     second_city_name: str,
-    second_city_info: dict,
+    second_city_info: Observation,
 ):
     """Print out the two cities' weathers"""
     if (
-        WEATHERS[first_city_info["weather_status"]]
-        == WEATHERS[second_city_info["weather_status"]]
+        WEATHERS[first_city_info.weather_status]
+        == WEATHERS[second_city_info.weather_status]
     ):
         console.print(
-            f"Both {first_city_name} and {second_city_name} is {WEATHERS[first_city_info['weather_status']]}"
+            f"Both {first_city_name} and {second_city_name} is {WEATHERS[first_city_info.weather_status]}"
         )
     else:
         console.print(
-            f"{first_city_name} is {WEATHERS[first_city_info['weather_status']]}, while {second_city_name} is {WEATHERS[second_city_info['weather_status']]}."
+            f"{first_city_name} is {WEATHERS[first_city_info.weather_status]}, while {second_city_name} is {WEATHERS[second_city_info.weather_status]}."
         )
 
 
+@timed("output.print_compared_temperature")
 def print_compared_temperature(
     first_city_name: str,
-    first_city_info: dict,
+    first_city_info: Observation,
     second_city_name: str,
-    second_city_info: dict,
+    second_city_info: Observation,
     unit: UnitType,
 ):
     """Print out the two cities' temperatures"""
-    first_city_temp = first_city_info["temperature_celsius"]
-    second_city_temp = second_city_info["temperature_celsius"]
+    first_city_temp = first_city_info.temperature_celsius
+    second_city_temp = second_city_info.temperature_celsius
     difference = first_city_temp - second_city_temp
     if unit == UnitType.FAHRENHEIT:
         difference *= 9 / 5
@@ -84,3 +102,152 @@ def print_compared_temperature(
         console.print(
             f"{first_city_name} has the same temperaure as {second_city_name} ({second_city_temp:.2f}{unit_symbol})."
         )
+
+
+@timed("output.print_forecast")
+def print_forecast(forecast_days: Iterable[DailyForecast], unit: UnitType):
+    """Print the most common weather and average temperature of each day"""
+    console.print()
+    for day in forecast_days:
+        console.print(f"[{day.date}]")
+        if day.weather_status == "Tornado":
+            console.print(
+                "[bold red]The city is likely to be hit by a tornado! Please stay safe![/]"
+            )
+        else:
+            console.print(
+                f"The weather on this day is mostly {WEATHERS[day.weather_status]}."
+            )
+        average_temperature = from_kelvin_convert_to_celsius(day.temperature_average)
+        if unit == UnitType.FAHRENHEIT:
+            unit_symbol = "°F"
+            average_temperature = from_celsius_convert_to_fahrenheit(
+                average_temperature
+            )
+        else:
+            unit_symbol = "°C"
+        console.print(
+            f"The average temperature will be {average_temperature:.2f}{unit_symbol}."
+        )
+        console.print()
+
+
+def get_weather_table(unit: UnitType, *leading_columns: str):
+    """Return an empty weather table with the given extra columns in front"""
+    from rich.table import Table
+
+    unit_symbol = "°F" if unit == UnitType.FAHRENHEIT else "°C"
+    table = Table()
+    for column in leading_columns:
+        table.add_column(column, justify="right")
+    table.add_column("City")
+    table.add_column("Weather")
+    table.add_column(f"Temperature ({unit_symbol})", justify="right")
+    table.add_column("Humidity (%)", justify="right")
+    table.add_column("Wind speed (m/s)", justify="right")
+    return table
+
+
+def get_weather_row(city_name: str, city_info: Observation, unit: UnitType) -> tuple:
+    """Return the table cells of one city"""
+    temperature = city_info.temperature_celsius
+    if unit == UnitType.FAHRENHEIT:
+        temperature = from_celsius_convert_to_fahrenheit(temperature)
+    if city_info.stale:
+        city_name = f"{city_name} [yellow](stale)[/]"
+    return (
+        city_name,
+        WEATHERS[city_info.weather_status],
+        f"{temperature:.2f}",
+        str(city_info.humidity),
+        str(city_info.wind_speed),
+    )
+
+
+@timed("output.print_ranked_cities")
+def print_ranked_cities(ranked_cities: list[tuple[str, Observation]], unit: UnitType):
+    """Print a table of cities, ordered as given"""
+    table = get_weather_table(unit, "#")
+    for rank, (city_name, city_info) in enumerate(ranked_cities, start=1):
+        table.add_row(str(rank), *get_weather_row(city_name, city_info, unit))
+    console.print(table)
+
+
+def get_watch_table(rows: dict[str, tuple], unit: UnitType):
+    """Return the dashboard table from already formatted rows"""
+    table = get_weather_table(unit)
+    table.add_column("Observed", justify="right")
+    for city, row in rows.items():
+        table.add_row(*(row or (city, "…", "", "", "", "")))
+    return table
+
+
+@timed("output.print_nearest_cities")
+def print_nearest_cities(nearest_cities: list[tuple[str, float, float, float]]):
+    """Print a table of cities with their distance and coordinates"""
+    from rich.table import Table
+
+    table = Table()
+    table.add_column("#", justify="right")
+    table.add_column("City")
+    table.add_column("Distance (km)", justify="right")
+    table.add_column("Latitude", justify="right")
+    table.add_column("Longitude", justify="right")
+    for rank, (city_name, distance, lat, lon) in enumerate(nearest_cities, start=1):
+        table.add_row(
+            str(rank), city_name, f"{distance:.1f}", f"{lat:.4f}", f"{lon:.4f}"
+        )
+    console.print(table)
+
+
+@timed("output.print_history")
+def print_history(summaries: list[tuple[str, dict | None]], unit: UnitType):
+    """Print a table of each city's recorded temperature range"""
+    from rich.table import Table
+
+    unit_symbol = "°F" if unit == UnitType.FAHRENHEIT else "°C"
+    table = Table()
+    table.add_column("City")
+    table.add_column("Observations", justify="right")
+    for statistic in ("Min", "Mean", "Max"):
+        table.add_column(f"{statistic} ({unit_symbol})", justify="right")
+    table.add_column("Last observed", justify="right")
+    for city_name, summary in summaries:
+        if summary is None:
+            table.add_row(city_name, "0", "", "", "", "")
+            continue
+        temperatures = []
+        for key in ("temperature_min", "temperature_mean", "temperature_max"):
+            temperature = from_kelvin_convert_to_celsius(summary[key])
+            if unit == UnitType.FAHRENHEIT:
+                temperature = from_celsius_convert_to_fahrenheit(temperature)
+            temperatures.append(f"{temperature:.2f}")
+        table.add_row(
+            city_name,
+            str(summary["observations"]),
+            *temperatures,
+            datetime.fromtimestamp(summary["last_observed"]).strftime("%Y-%m-%d %H:%M"),
+        )
+    console.print(table)
+
+
+def print_json_line(record: dict) -> None:
+    """Write one JSON object per line to stdout and flush it straight away"""
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def print_timings(timings: dict[str, dict], as_json: bool = False) -> None:
+    """Print the per-stage timing breakdown to stderr"""
+    if as_json:
+        sys.stderr.write(json.dumps(timings) + "\n")
+        return
+    from rich.table import Table
+
+    table = Table(title="Timings (inclusive of nested stages)")
+    table.add_column("Stage")
+    table.add_column("Calls", justify="right")
+    table.add_column("Total (ms)", justify="right")
+    for name, timing in timings.items():
+        table.add_row(name, str(timing["calls"]), f"{timing['total_ms']:.2f}")
+    Console(stderr=True).print(table)
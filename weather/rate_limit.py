@@ -0,0 +1,50 @@
+import time
+
+from .sqlite_store import ConnectionPerThread, immediate_transaction
+
+
+class TokenBucket:
+    """Token bucket kept in sqlite so every process sharing the API key shares it
+
+    Callers never fail for lack of tokens: each one takes the next token,
+    even if that drives the count below zero, and sleeps until its token
+    has been refilled. Concurrent callers therefore queue up in order.
+    """
+
+    def __init__(self, path: str, calls_per_minute: int, burst: int):
+        self.path = path
+        self.rate = calls_per_minute / 60
+        self.capacity = max(1, burst)
+        self._connections = ConnectionPerThread(
+            path,
+            "CREATE TABLE IF NOT EXISTS token_bucket"
+            " (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)",
+        )
+
+    def reserve(self, name: str = "api") -> float:
+        """Take one token and return how many seconds to wait before using it"""
+        connection = self._connections.get()
+        # Taking the write lock up front serialises every process on the file.
+        with immediate_transaction(connection):
+            row = connection.execute(
+                "SELECT tokens, updated FROM token_bucket WHERE name = ?", (name,)
+            ).fetchone()
+            now = time.time()
+            if row is None:
+                tokens = self.capacity
+            else:
+                tokens, updated = row
+                tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            tokens -= 1
+            connection.execute(
+                "INSERT OR REPLACE INTO token_bucket VALUES (?, ?, ?)",
+                (name, tokens, now),
+            )
+        return max(0.0, -tokens / self.rate)
+
+    def acquire(self, name: str = "api") -> float:
+        """Wait for a token; return the seconds spent waiting"""
+        delay = self.reserve(name)
+        if delay:
+            time.sleep(delay)
+        return delay
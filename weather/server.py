@@ -0,0 +1,148 @@
+import json
+import socket
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from typer import Abort
+
+from .city_index import get_trigram_index
+from .gazetteer import GAZETTEER_FILE
+from .mappings import (
+    get_all_cities,
+    get_forecast_records,
+    get_weather_record,
+)
+from .metrics import registry
+from .weather_api import (
+    RateLimited,
+    call_api,
+    call_api_concurrently,
+    call_forecast_api,
+    get_offline_location,
+    get_session,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def get_weather(cities: list[str]) -> tuple[int, dict]:
+    """Current weather of the first city"""
+    city = cities[0]
+    observation = call_api(city, compare=True, interactive=False)
+    if observation is None:
+        return 404, {"city": city, "error": "City not found"}
+    return 200, get_weather_record(city, observation)
+
+
+def get_forecast(cities: list[str]) -> tuple[int, dict]:
+    """Daily forecast of the first city"""
+    city = cities[0]
+    location = get_offline_location(city)
+    if location is None:
+        observation = call_api(city, compare=True, interactive=False)
+        if observation is None:
+            return 404, {"city": city, "error": "City not found"}
+        location = observation.location
+    forecast = call_forecast_api(location, compare=True)
+    if forecast is None:
+        return 502, {"city": city, "error": "Forecast unavailable"}
+    return 200, {
+        "city": city,
+        "name": location.name,
+        "lat": location.lat,
+        "lon": location.lon,
+        "days": get_forecast_records(forecast.days),
+    }
+
+
+def get_comparison(cities: list[str]) -> tuple[int, dict]:
+    """Current weather of every city, fetched concurrently"""
+    if len(cities) < 2:
+        return 400, {"error": "At least two cities are needed for a comparison"}
+    observations = call_api_concurrently(cities, compare=True, interactive=False)
+    missing_cities = [
+        city for city, observation in zip(cities, observations) if observation is None
+    ]
+    if missing_cities:
+        return 404, {"cities": missing_cities, "error": "City not found"}
+    records = [
+        get_weather_record(city, observation)
+        for city, observation in zip(cities, observations)
+    ]
+    comparison = {"cities": records}
+    if len(records) == 2:
+        comparison["temperature_difference_celsius"] = (
+            records[0]["temperature_celsius"] - records[1]["temperature_celsius"]
+        )
+    return 200, comparison
+
+
+ROUTES = {
+    "/weather": get_weather,
+    "/forecast": get_forecast,
+    "/comparison": get_comparison,
+}
+
+
+class WeatherRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # end_headers() sends the headers in a write of their own, so with
+        # Nagle on, the JSON body would wait for the client's delayed ACK.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") == "/metrics":
+            self.send_body(
+                200, registry.render().encode("utf-8"), PROMETHEUS_CONTENT_TYPE
+            )
+            return
+        route = ROUTES.get(url.path.rstrip("/"))
+        if route is None:
+            self.send_json(404, {"error": "Unknown endpoint"})
+            return
+        cities = [city for city in parse_qs(url.query).get("city", []) if city.strip()]
+        if not cities:
+            self.send_json(400, {"error": "Missing city parameter"})
+            return
+        try:
+            status, payload = route(cities)
+        except RateLimited:
+            # The upstream's quota, not this client's, ran out; try again later.
+            status, payload = 503, {"error": "Rate limited by the weather service"}
+        except Abort:
+            status, payload = 502, {"error": "Unable to connect"}
+        self.send_json(status, payload)
+
+    def send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_body(status, body, "application/json; charset=utf-8")
+
+    def send_body(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def warm_up() -> None:
+    """Load the gazetteer, fuzzy index and HTTP session before the first request"""
+    get_trigram_index(get_all_cities(), GAZETTEER_FILE)
+    get_session()
+
+
+def run_server(host: str, port: int) -> None:
+    """Serve the JSON endpoints until interrupted"""
+    warm_up()
+    server = ThreadingHTTPServer((host, port), WeatherRequestHandler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,41 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+LOCK_TIMEOUT = 30.0
+
+
+@contextmanager
+def immediate_transaction(connection: sqlite3.Connection):
+    """Hold the database write lock for the enclosed read-modify-write"""
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+class ConnectionPerThread:
+    """Autocommit connections to a sqlite file that other processes share
+
+    Each thread opens its own connection on first use and keeps it, so hot
+    paths skip the connect and the schema. Statements outside a transaction
+    still see whatever other processes last committed.
+    """
+
+    def __init__(self, path: str, schema: str):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=LOCK_TIMEOUT, isolation_level=None
+            )
+            connection.execute(self.schema)
+            self._local.connection = connection
+        return connection
@@ -0,0 +1,62 @@
+import threading
+import time
+from functools import wraps
+
+_enabled = False
+_spans = {}
+_lock = threading.Lock()
+
+
+def enable_timings() -> None:
+    global _enabled
+    _enabled = True
+
+
+def timings_enabled() -> bool:
+    return _enabled
+
+
+def record(name: str, seconds: float) -> None:
+    """Add one measurement to the named stage"""
+    with _lock:
+        count, total = _spans.get(name, (0, 0.0))
+        _spans[name] = (count + 1, total + seconds)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+
+
+def timed(name: str):
+    """Decorate a function so every call is recorded under name"""
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_timings() -> dict[str, dict]:
+    """Return the call count and total milliseconds of every stage"""
+    with _lock:
+        return {
+            name: {"calls": count, "total_ms": total * 1000}
+            for name, (count, total) in _spans.items()
+        }
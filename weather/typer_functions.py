@@ -1,49 +1,123 @@
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
 import typer
 
+from . import IMPORT_STARTED
+from .gazetteer import CITY_LIST_FILE, GAZETTEER_FILE, GazetteerError, compile_gazetteer
+from .history import find_history_paths, summarize_history
 from .mappings import (
-    WEATHERS,
+    RANKING_KEYS,
     Comparison_Feature,
+    Ranking_Feature,
     UnitType,
-    from_celsius_convert_to_fahrenheit,
-    from_kelvin_convert_to_celsius,
-    get_five_days_for_forecast,
-    get_weather_descriptions,
-    parse_forecast_response,
+    get_all_cities,
+    get_weather_record,
 )
+from .metrics import write_metrics
 from .output import (
     console,
     print_compared_temperature,
     print_compared_weather,
+    print_forecast,
+    print_history,
+    print_json_line,
+    print_nearest_cities,
+    print_ranked_cities,
+    print_stale_notice,
+    print_timings,
     print_weather_descriptions,
 )
-from .weather_api import API_Response, call_api, call_forecast_api
+from .timings import enable_timings, get_timings, record
+from .weather_api import (
+    CURRENT_WEATHER_TTL,
+    HISTORY_DIR,
+    MAX_CONCURRENT_REQUESTS,
+    ONE_DAY,
+    LookupFailure,
+    call_api,
+    call_api_concurrently,
+    call_forecast_api,
+    disable_prompts,
+    get_offline_location,
+    iter_call_api,
+)
+
+COMPLETION_LIMIT = 20
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
 
 app = typer.Typer()
 
 
+def complete_city(ctx: typer.Context, param, incomplete: str) -> list[str]:
+    """Offer exact gazetteer names for what has been typed so far
+
+    Hooked in through shell_complete rather than autocompletion, which
+    would drop every name that does not literally start with the typed
+    text, so "sao p" could never complete to "São Paulo".
+    """
+    return get_all_cities().complete(incomplete, COMPLETION_LIMIT)
+
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    timings: bool = typer.Option(
+        False, "--timings", help="Print how long each stage of the command took"
+    ),
+    timings_json: bool = typer.Option(
+        False, "--timings-json", help="Print the stage timings as JSON"
+    ),
+    metrics_file: str = typer.Option(
+        None, help="Write request and cache metrics in Prometheus format here"
+    ),
+    no_input: bool = typer.Option(
+        False,
+        "--no-input",
+        help="Never ask which city was meant; pick a confident match or fail",
+    ),
+):
+    """Check the weather of cities from the command line"""
+    if timings or timings_json:
+        enable_timings()
+        record("import", time.perf_counter() - IMPORT_STARTED)
+        ctx.call_on_close(lambda: print_timings(get_timings(), as_json=timings_json))
+    if metrics_file:
+        ctx.call_on_close(lambda: write_metrics(metrics_file))
+    if no_input:
+        disable_prompts()
+
+
 @app.command()
 def check_weather(
-    city: str = typer.Argument(..., help="Name of city to be checked"),
+    city: str = typer.Argument(
+        ..., help="Name of city to be checked", shell_complete=complete_city
+    ),
     unit: UnitType = typer.Option(
         UnitType.CELSIUS, help="Unit preference in degree Celsius/Fahrenheit"
     ),
 ) -> None:
     """Get weather, temperature, humdity, wind speed of the city"""
-    response = call_api(city)
-    if response[API_Response.JSON] is None:
+    observation = call_api(city)
+    if observation is None:
         raise typer.Abort()
 
-    print_weather_descriptions(
-        response[API_Response.JSON], response[API_Response.CITY], unit
-    )
+    print_weather_descriptions(observation, unit)
     console.print()
     console.rule()
 
 
 @app.command()
 def check_comparison(
-    first_city: str = typer.Argument(..., help="First city to compare with"),
-    second_city: str = typer.Argument(..., help="Second city to compare with"),
+    first_city: str = typer.Argument(
+        ..., help="First city to compare with", shell_complete=complete_city
+    ),
+    second_city: str = typer.Argument(
+        ..., help="Second city to compare with", shell_complete=complete_city
+    ),
     unit: UnitType = typer.Option(
         UnitType.CELSIUS, help="Unit preference in degree Celsius/Fahrenheit"
     ),
@@ -53,19 +127,18 @@ def check_comparison(
 ):
     """Compare city's temperature and weather forecast against another city"""
     console.print()
-    response = call_api(first_city, compare=True)
-    if response[API_Response.JSON] is None:
+    first_city_info, second_city_info = call_api_concurrently(
+        [first_city, second_city], compare=True
+    )
+    if first_city_info is None:
         console.print("[bold red]The first city name is invalid.[/]")
         raise typer.Abort()
-    first_city_name = response[API_Response.CITY].title().strip()
-    first_city_info = get_weather_descriptions(response[API_Response.JSON])
+    first_city_name = first_city_info.location.name
 
-    second_response = call_api(second_city, compare=True)
-    if second_response[API_Response.JSON] is None:
+    if second_city_info is None:
         console.print("[bold red]The second city name is invalid.[/]")
         raise typer.Abort()
-    second_city_name = second_response[API_Response.CITY].title().strip()
-    second_city_info = get_weather_descriptions(second_response[API_Response.JSON])
+    second_city_name = second_city_info.location.name
 
     if feature == Comparison_Feature.WEATHER:
         print_compared_weather(
@@ -84,52 +157,203 @@ def check_comparison(
         )
     else:
         console.print("[bold red]Invalid input.[/]")
+    for city_info in (first_city_info, second_city_info):
+        if city_info.stale:
+            print_stale_notice(
+                f"weather for {city_info.location.name}", city_info.observed
+            )
     console.print()
     console.rule()
 
 
 @app.command()
-def check_forecast(
-    city: str = typer.Argument(..., help="Name of the city to be forecasted"),
+def check_ranking(
+    cities: list[str] = typer.Argument(
+        ..., help="Cities to rank against each other", shell_complete=complete_city
+    ),
     unit: UnitType = typer.Option(
         UnitType.CELSIUS, help="Unit preference in degree Celsius/Fahrenheit"
     ),
+    rank_by: Ranking_Feature = typer.Option(
+        Ranking_Feature.TEMPERATURE, help="Temperature, Humidity or Wind speed"
+    ),
 ):
-    """Get a 5 day temperature and weather forecast of the city"""
-    response = call_api(city)
-    if response[API_Response.JSON] is None:
+    """Rank any number of cities by temperature, humidity or wind speed"""
+    console.print()
+    ranked_cities = []
+    for city, observation in zip(cities, call_api_concurrently(cities, compare=True)):
+        if observation is None:
+            console.print(f"[bold red]{city.title().strip()} could not be found.[/]")
+            continue
+        ranked_cities.append((observation.location.name, observation))
+    if not ranked_cities:
         raise typer.Abort()
 
-    forecast_response = call_forecast_api(city)
-    five_days_list = get_five_days_for_forecast()
-    temperature_and_weather_forecast = parse_forecast_response(
-        forecast_response, five_days_list
+    ranked_cities.sort(
+        key=lambda ranked_city: getattr(ranked_city[1], RANKING_KEYS[rank_by]),
+        reverse=True,
     )
+    print_ranked_cities(ranked_cities, unit)
     console.print()
-    for day_index, (temperatures_of_the_day, weather_counts_of_the_day) in enumerate(
-        temperature_and_weather_forecast
-    ):
-        console.print(f"[{five_days_list[day_index]}]")
-        if weather_counts_of_the_day.most_common(1)[0] == "Tornado":
-            console.print(
-                "[bold red]The city is likely to be hit by a tornado! Please stay safe![/]"
-            )
+    console.rule()
+
+
+@app.command()
+def check_batch(
+    cities_file: typer.FileText = typer.Argument(
+        "-", help="File with one city per line, or - to read from stdin"
+    ),
+    concurrency: int = typer.Option(
+        MAX_CONCURRENT_REQUESTS, min=1, help="Number of cities fetched at once"
+    ),
+):
+    """Stream the weather of many cities as JSON Lines"""
+    # Keep stdout clean for the JSON records; messages go to stderr.
+    console.file = sys.stderr
+    cities = (line.strip() for line in cities_file if line.strip())
+    for city, result in iter_call_api(cities, concurrency):
+        if isinstance(result, LookupFailure):
+            print_json_line({"city": city, "error": result.value})
         else:
-            console.print(
-                f"The weather on this day is mostly {WEATHERS[weather_counts_of_the_day.most_common(1)[0][0]]}."
-            )
-        average_temperature = from_kelvin_convert_to_celsius(
-            sum(temperatures_of_the_day) / len(temperatures_of_the_day)
+            print_json_line(get_weather_record(city, result))
+
+
+@app.command()
+def check_forecast(
+    city: str = typer.Argument(
+        ..., help="Name of the city to be forecasted", shell_complete=complete_city
+    ),
+    unit: UnitType = typer.Option(
+        UnitType.CELSIUS, help="Unit preference in degree Celsius/Fahrenheit"
+    ),
+):
+    """Get a 5 day temperature and weather forecast of the city"""
+    # A GeoNames gazetteer knows the coordinates; skip the current weather call.
+    location = get_offline_location(city)
+    if location is None:
+        observation = call_api(city)
+        if observation is None:
+            raise typer.Abort()
+        location = observation.location
+
+    forecast = call_forecast_api(location)
+    if forecast is None:
+        raise typer.Abort()
+    print_forecast(forecast.days, unit)
+    if forecast.stale:
+        print_stale_notice("forecast")
+        console.print()
+    console.rule()
+
+
+@app.command()
+def build_gazetteer(
+    source: Path = typer.Argument(
+        CITY_LIST_FILE,
+        exists=True,
+        dir_okay=False,
+        help="City list, one name per line, or a GeoNames dump with coordinates",
+    ),
+):
+    """Compile the city list into the memory-mapped city gazetteer"""
+    try:
+        city_count = compile_gazetteer(source)
+    except GazetteerError as error:
+        console.print(f"[bold red]{error}[/]")
+        raise typer.Abort()
+    console.print(f"Compiled {city_count} cities into {GAZETTEER_FILE}.")
+    if source != CITY_LIST_FILE:
+        console.print(
+            f"Set CITY_LIST_FILE={source} to keep it from being rebuilt from {CITY_LIST_FILE.name}."
         )
-        if unit == UnitType.FAHRENHEIT:
-            unit_symbol = "°F"
-            average_temperature = from_celsius_convert_to_fahrenheit(
-                average_temperature
-            )
-        else:
-            unit_symbol = "°C"
+
+
+@app.command()
+def nearest(
+    lat: float = typer.Option(..., min=-90, max=90, help="Latitude in degrees"),
+    lon: float = typer.Option(..., min=-180, max=180, help="Longitude in degrees"),
+    count: int = typer.Option(5, min=1, help="Number of cities to list"),
+):
+    """List the cities closest to a point, from the local gazetteer"""
+    gazetteer = get_all_cities()
+    if not gazetteer.has_coordinates:
         console.print(
-            f"The average temperature will be {average_temperature:.2f}{unit_symbol}."
+            "[bold red]The gazetteer has no coordinates. Rebuild it from a GeoNames dump with build-gazetteer.[/]"
         )
-        console.print()
-    console.rule()
+        raise typer.Abort()
+    print_nearest_cities(
+        [
+            (gazetteer[city_id], distance, *gazetteer.coordinates(city_id))
+            for distance, city_id in gazetteer.nearest(lat, lon, count)
+        ]
+    )
+
+
+@app.command()
+def history(
+    cities: list[str] = typer.Argument(
+        ..., help="Cities to summarise", shell_complete=complete_city
+    ),
+    days: float = typer.Option(7, min=0, help="How many days back to look"),
+    since: datetime = typer.Option(None, help="Start of the range, instead of --days"),
+    until: datetime = typer.Option(None, help="End of the range [default: now]"),
+    unit: UnitType = typer.Option(
+        UnitType.CELSIUS, help="Unit preference in degree Celsius/Fahrenheit"
+    ),
+):
+    """Summarise the temperatures recorded for cities over a time range"""
+    if not HISTORY_DIR:
+        console.print("[bold red]The history is turned off; set HISTORY_DIR.[/]")
+        raise typer.Abort()
+    until_time = (until or datetime.now()).timestamp()
+    since_time = since.timestamp() if since else until_time - days * ONE_DAY
+    summaries = []
+    for city in cities:
+        name = city.title().strip()
+        paths = find_history_paths(Path(HISTORY_DIR), city)
+        if not paths:
+            summaries.append((name, None))
+        # Places sharing the name are told apart by their coordinates.
+        for coordinates, path in paths.items():
+            summaries.append(
+                (
+                    name if len(paths) == 1 else f"{name} ({coordinates})",
+                    summarize_history(path, since_time, until_time),
+                )
+            )
+    print_history(summaries, unit)
+
+
+@app.command()
+def watch(
+    cities: list[str] = typer.Argument(
+        ..., help="Cities to keep on the dashboard", shell_complete=complete_city
+    ),
+    unit: UnitType = typer.Option(
+        UnitType.CELSIUS, help="Unit preference in degree Celsius/Fahrenheit"
+    ),
+    interval: float = typer.Option(
+        CURRENT_WEATHER_TTL, min=1, help="Seconds between refreshes of each city"
+    ),
+):
+    """Keep a live-updating weather table of several cities"""
+    from .watch import watch_cities
+
+    try:
+        watch_cities(cities, unit, interval)
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command()
+def serve(
+    host: str = typer.Option(DEFAULT_HOST, help="Address to listen on"),
+    port: int = typer.Option(DEFAULT_PORT, help="Port to listen on"),
+):
+    """Serve weather, forecast and comparison lookups as JSON over HTTP"""
+    from .server import run_server
+
+    console.print(
+        f"Serving /weather, /forecast, /comparison and /metrics on http://{host}:{port}/"
+    )
+    run_server(host, port)
@@ -0,0 +1,60 @@
+import time
+from datetime import datetime
+
+from rich.live import Live
+
+from .mappings import Observation, UnitType
+from .output import console, get_watch_table, get_weather_row
+from .weather_api import LookupFailure, disable_background_refresh, iter_call_api
+
+MIN_SLEEP = 0.5
+
+
+def get_dashboard_row(
+    city: str, result: Observation | LookupFailure, unit: UnitType
+) -> tuple:
+    """Return the formatted cells of one city, or a placeholder on failure"""
+    if result is LookupFailure.UNREACHABLE:
+        return (city.title().strip(), "[red]unable to connect[/]", "", "", "", "")
+    if result is LookupFailure.RATE_LIMITED:
+        return (city.title().strip(), "[red]rate limited[/]", "", "", "", "")
+    if result is LookupFailure.NOT_FOUND:
+        return (city.title().strip(), "[red]not found[/]", "", "", "", "")
+    observed = datetime.fromtimestamp(result.observed).strftime("%H:%M")
+    return (*get_weather_row(result.location.name, result, unit), observed)
+
+
+def watch_cities(cities: list[str], unit: UnitType, interval: float) -> None:
+    """Keep a live table of the cities, refreshing each one every interval
+
+    After the first load the cities are spread evenly over the interval, so
+    requests trickle in instead of arriving in bursts. The table is only
+    redrawn when a row's content actually changed.
+
+    Each city is due again interval seconds after its result landed, by
+    which time an interval of CURRENT_WEATHER_TTL has expired its cached
+    entry; the expired entry is then refreshed before it is shown.
+    """
+    disable_background_refresh()
+    cities = list(dict.fromkeys(cities))
+    rows = dict.fromkeys(cities)
+    next_refresh = dict.fromkeys(cities, 0.0)
+    stagger = interval / len(cities)
+    with Live(get_watch_table(rows, unit), console=console, auto_refresh=False) as live:
+        first_load = True
+        while True:
+            now = time.monotonic()
+            due_cities = [city for city in cities if next_refresh[city] <= now]
+            changed = False
+            for city, result in iter_call_api(due_cities):
+                row = get_dashboard_row(city, result, unit)
+                if row != rows[city]:
+                    rows[city] = row
+                    changed = True
+                next_refresh[city] = time.monotonic() + interval
+                if first_load:
+                    next_refresh[city] += cities.index(city) * stagger
+            first_load = False
+            if changed:
+                live.update(get_watch_table(rows, unit), refresh=True)
+            time.sleep(max(MIN_SLEEP, min(next_refresh.values()) - time.monotonic()))
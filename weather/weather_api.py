@@ -1,59 +1,651 @@
-from enum import IntEnum, StrEnum
+import atexit
+import logging
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import UTC, datetime, timedelta
+from enum import StrEnum
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-import requests
-import requests_cache
 from decouple import config
 from typer import Abort
 
-from .mappings import fuzzy_search
+from .cache import ResponseCache, SingleFlight
+from .circuit_breaker import CircuitBreaker
+from .history import append_observation
+from .mappings import (
+    COORDINATE_PRECISION,
+    STALE_KEY,
+    CityMatch,
+    Forecast,
+    Location,
+    Observation,
+    get_all_cities,
+    parse_forecast,
+    parse_observation,
+    pick_city_match,
+    rank_city_matches,
+)
+from .metrics import (
+    alias_lookups,
+    fuzzy_fallbacks,
+    registry,
+    upstream_latency,
+    upstream_requests,
+)
 from .output import console
+from .timings import record, timed, timings_enabled
 
-BASE_URL = "https://api.openweathermap.org/data/2.5/"
+if TYPE_CHECKING:
+    import requests
+
+    from .aliases import AliasStore
+
+BASE_URL = config("BASE_URL", default="https://api.openweathermap.org/data/2.5/")
 WEATHER_SERVICE = "{BASE_URL}weather?q={city_name}&appid={API_KEY}"
 FORECAST_SERVICE = "{BASE_URL}forecast?lat={lat}&lon={lon}&appid={API_KEY}"
-API_KEY = config("API_KEY")
+GROUP_SERVICE = "{BASE_URL}group?id={city_ids}&appid={API_KEY}"
+MAX_GROUP_SIZE = 20
+
+SUCCESS_CODE = "200"
 
 ONE_DAY = 86400
-requests_cache.install_cache("cache.db", backend="sqlite", expire_after=ONE_DAY)
+CURRENT_WEATHER_TTL = config("CURRENT_WEATHER_TTL", default=600, cast=int)
+FORECAST_TTL = config("FORECAST_TTL", default=3 * 3600, cast=int)
+CACHE_SIZE = config("CACHE_SIZE", default=1024, cast=int)
+CACHE_FILE = "cache.db"
+CACHE_MISS_STATUS = 504
+RATE_LIMIT_FILE = "rate_limit.db"
+# Shared by every process using the API key; 0 turns the limiter off.
+API_CALLS_PER_MINUTE = config("API_CALLS_PER_MINUTE", default=60, cast=int)
+API_CALL_BURST = config("API_CALL_BURST", default=10, cast=int)
+ALIAS_FILE = "aliases.db"
+# Misspelled cities remembered across runs; 0 turns the alias store off.
+ALIAS_CAPACITY = config("ALIAS_CAPACITY", default=1000, cast=int)
+# Every fresh observation is appended here; empty turns the history off.
+HISTORY_DIR = config("HISTORY_DIR", default="history")
+weather_cache = ResponseCache(max_size=CACHE_SIZE, ttl=CURRENT_WEATHER_TTL)
+forecast_cache = ResponseCache(max_size=CACHE_SIZE, ttl=FORECAST_TTL)
+weather_flight = SingleFlight()
+forecast_flight = SingleFlight()
+
+
+def collect_cache_metrics():
+    """Expose the in-memory cache and single-flight counters to the registry"""
+    caches = {("weather",): weather_cache, ("forecast",): forecast_cache}
+    flights = {("weather",): weather_flight, ("forecast",): forecast_flight}
+    return [
+        (
+            "weather_memory_cache_hits_total",
+            "counter",
+            "Lookups answered by the in-memory response cache",
+            ("cache",),
+            {key: cache.hits for key, cache in caches.items()},
+        ),
+        (
+            "weather_memory_cache_misses_total",
+            "counter",
+            "Lookups the in-memory response cache could not answer",
+            ("cache",),
+            {key: cache.misses for key, cache in caches.items()},
+        ),
+        (
+            "weather_memory_cache_entries",
+            "gauge",
+            "Entries currently held by the in-memory response cache",
+            ("cache",),
+            {key: len(cache) for key, cache in caches.items()},
+        ),
+        (
+            "weather_singleflight_calls_total",
+            "counter",
+            "Lookups that went on to fetch, after the in-memory cache missed",
+            ("cache",),
+            {key: flight.calls for key, flight in flights.items()},
+        ),
+        (
+            "weather_singleflight_coalesced_total",
+            "counter",
+            "Lookups that waited on an identical fetch already in flight",
+            ("cache",),
+            {key: flight.coalesced for key, flight in flights.items()},
+        ),
+    ]
+
+
+registry.add_collector(collect_cache_metrics)
+
+MAX_CONCURRENT_REQUESTS = 8
+CONNECT_TIMEOUT = config("CONNECT_TIMEOUT", default=3.05, cast=float)
+READ_TIMEOUT = config("READ_TIMEOUT", default=10.0, cast=float)
+MAX_RETRIES = config("MAX_RETRIES", default=3, cast=int)
+RETRY_BACKOFF = 0.5
+RETRY_JITTER = 0.25
+# 429 is left out: retrying a throttled key only spends more of its quota,
+# and the response has to reach parse_api_response to be reported.
+RETRY_STATUSES = (500, 502, 503, 504)
+STALE_WHILE_REVALIDATE = config("STALE_WHILE_REVALIDATE", default=600, cast=int)
+# How long an exiting process waits, in total, for background refreshes.
+REFRESH_EXIT_TIMEOUT = config("REFRESH_EXIT_TIMEOUT", default=1.0, cast=float)
+# Shared by every process, like the rate limiter.
+CIRCUIT_BREAKER_FILE = "circuit_breaker.db"
+CIRCUIT_FAILURE_THRESHOLD = config("CIRCUIT_FAILURE_THRESHOLD", default=5, cast=int)
+CIRCUIT_RESET_TIMEOUT = config("CIRCUIT_RESET_TIMEOUT", default=30.0, cast=float)
+# Unattended lookups take the best fuzzy match only at or above this score.
+FUZZY_AUTO_SELECT_SCORE = config("FUZZY_AUTO_SELECT_SCORE", default=0.85, cast=float)
+upstream_breaker = CircuitBreaker(
+    CIRCUIT_BREAKER_FILE, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+)
+
+
+def collect_circuit_metrics():
+    """Expose the upstream circuit breaker to the registry"""
+    return [
+        (
+            "weather_circuit_breaker_open",
+            "gauge",
+            "1 while the upstream circuit breaker is open or half open",
+            (),
+            {(): int(upstream_breaker.state != CircuitBreaker.CLOSED)},
+        ),
+        (
+            "weather_circuit_breaker_opened_total",
+            "counter",
+            "Times the upstream circuit breaker opened",
+            (),
+            {(): upstream_breaker.times_opened},
+        ),
+        (
+            "weather_circuit_breaker_rejections_total",
+            "counter",
+            "Requests refused without contacting the upstream",
+            (),
+            {(): upstream_breaker.rejections},
+        ),
+    ]
+
+
+registry.add_collector(collect_circuit_metrics)
+
+_session = None
+_session_lock = threading.Lock()
+_prompt_lock = threading.Lock()
+_prompts_enabled = True
+_background_refresh_enabled = True
+_refreshing = {}
+_refreshing_lock = threading.Lock()
 
 
 class Connection_Error(StrEnum):
     BAD_REQUEST = "400"
     PAGE_NOT_FOUND = "404"
+    TOO_MANY_REQUESTS = "429"
+
+
+class LookupFailure(StrEnum):
+    UNREACHABLE = "Unable to connect"
+    RATE_LIMITED = "Rate limited by the weather service"
+    NOT_FOUND = "City not found"
+
+
+class RateLimited(Abort):
+    """The weather service refused a request because the API key ran out of quota"""
+
+
+def get_offline_location(city: str) -> Location | None:
+    """Resolve a city to coordinates without a request
+
+    Exact (case-insensitive) names are found in the gazetteer when it was
+    built from a GeoNames dump; misspellings resolved before come from the
+    alias store. Anything else returns None.
+    """
+    gazetteer = get_all_cities()
+    city_id = gazetteer.find(city)
+    if city_id is None:
+        return get_alias_location(city)
+    if not gazetteer.has_coordinates:
+        return None
+    lat, lon = gazetteer.coordinates(city_id)
+    return Location(name=gazetteer[city_id], lat=round(lat, 4), lon=round(lon, 4))
+
+
+@cache
+def get_alias_store() -> "AliasStore":
+    """Open the alias store the first time a lookup needs it"""
+    from .aliases import AliasStore
+
+    return AliasStore(ALIAS_FILE, ALIAS_CAPACITY)
+
+
+def get_alias_location(city: str) -> Location | None:
+    """Return the city a misspelled input resolved to last time, if any"""
+    if not ALIAS_CAPACITY:
+        return None
+    alias = get_alias_store().get(normalize_city(city))
+    alias_lookups.inc("miss" if alias is None else "hit")
+    return None if alias is None else Location(*alias)
+
+
+def remember_alias(city: str, location: Location) -> None:
+    """Store what a misspelled input resolved to for later runs"""
+    if ALIAS_CAPACITY:
+        get_alias_store().set(
+            normalize_city(city), location.name, location.lat, location.lon
+        )
+
+
+def get_city_id(city: str) -> int | None:
+    """Return the GeoNames id of an exactly named city, which OpenWeather shares"""
+    gazetteer = get_all_cities()
+    if not gazetteer.has_coordinates:
+        return None
+    city_id = gazetteer.find(city)
+    return None if city_id is None else gazetteer.geonameid(city_id)
 
 
-class API_Response(IntEnum):
-    JSON = 0
-    CITY = 1
+@cache
+def get_api_key() -> str:
+    """Read the API key the first time a request needs it"""
+    return config("API_KEY")
 
 
-def call_api(city: str, compare: bool = False) -> list:
-    """Tries to call the API and return the parsed response"""
+def get_session() -> "requests.Session":
+    """Return the shared keep-alive session, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            start = time.perf_counter()
+            # Imported here so commands that never hit the network start fast.
+            from requests_cache import CachedSession
+
+            from .adapters import RateLimitedRetry, UpstreamAdapter
+            from .rate_limit import TokenBucket
+
+            imported = time.perf_counter()
+            rate_limiter = None
+            if API_CALLS_PER_MINUTE:
+                rate_limiter = TokenBucket(
+                    RATE_LIMIT_FILE, API_CALLS_PER_MINUTE, API_CALL_BURST
+                )
+            retry = RateLimitedRetry(
+                total=MAX_RETRIES,
+                backoff_factor=RETRY_BACKOFF,
+                backoff_jitter=RETRY_JITTER,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods={"GET"},
+                respect_retry_after_header=True,
+                rate_limiter=rate_limiter,
+            )
+            adapter = UpstreamAdapter(
+                upstream_breaker,
+                rate_limiter,
+                pool_connections=MAX_CONCURRENT_REQUESTS,
+                pool_maxsize=MAX_CONCURRENT_REQUESTS,
+                max_retries=retry,
+            )
+            session = CachedSession(
+                CACHE_FILE,
+                backend="sqlite",
+                expire_after=ONE_DAY,
+                urls_expire_after={
+                    f"{BASE_URL}weather": CURRENT_WEATHER_TTL,
+                    f"{BASE_URL}group": CURRENT_WEATHER_TTL,
+                    f"{BASE_URL}forecast": FORECAST_TTL,
+                },
+                # Fall back to an expired response when the upstream fails.
+                stale_if_error=True,
+            )
+            # Each fallback is logged as a warning with a full traceback; the
+            # command already says the answer is stale and metrics count it.
+            logging.getLogger("requests_cache").setLevel(logging.ERROR)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+            if timings_enabled():
+                record("network imports", imported - start)
+                record("session setup (cache.db)", time.perf_counter() - imported)
+    return _session
+
+
+def get_cached_response(session: "requests.Session", url: str):
+    """Return the cache.db response of the url, fresh or expired, or None"""
+    if session.settings.disabled:
+        return None
+    response = session.get(url, only_if_cached=True)
+    # A miss comes back as a synthetic 504; only 200s are ever cached.
+    return None if response.status_code == CACHE_MISS_STATUS else response
+
+
+def is_revalidatable(response) -> bool:
+    """Check whether an expired response is recent enough to serve while refreshing"""
+    return datetime.now(UTC) < response.expires + timedelta(
+        seconds=STALE_WHILE_REVALIDATE
+    )
+
+
+def join_refreshes(timeout: float = REFRESH_EXIT_TIMEOUT) -> None:
+    """Give the running background refreshes up to timeout seconds to finish"""
+    deadline = time.monotonic() + timeout
+    with _refreshing_lock:
+        threads = list(_refreshing.values())
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+
+@cache
+def join_refreshes_at_exit() -> None:
+    """Register join_refreshes to run at exit, the first time a refresh starts"""
+    atexit.register(join_refreshes)
+
+
+def refresh_in_background(url: str, endpoint: str) -> None:
+    """Re-request the url on a daemon thread, once at a time per url
+
+    A command prints its stale answer straight away. On exit the process
+    waits at most REFRESH_EXIT_TIMEOUT for the refresh to land in cache.db,
+    so a hanging upstream cannot hold a one-shot command open.
+    """
+    import requests
+
+    def refresh():
+        try:
+            response = get_session().get(url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            # A failed refresh comes back as the stale response from cache.db.
+            failed = getattr(response, "from_cache", False)
+            status = "error" if failed else str(response.status_code)
+        except requests.exceptions.RequestException:
+            status = "error"
+        finally:
+            with _refreshing_lock:
+                _refreshing.pop(url, None)
+        upstream_requests.inc(endpoint, "refresh", status)
+
+    with _refreshing_lock:
+        if url in _refreshing:
+            return
+        thread = _refreshing[url] = threading.Thread(target=refresh, daemon=True)
+    join_refreshes_at_exit()
+    thread.start()
+
+
+def fetch_json(url: str, endpoint: str = "other") -> dict:
+    """GET the url through the shared session and decode the JSON body
+
+    A response that expired less than STALE_WHILE_REVALIDATE seconds ago is
+    returned at once while a background request refreshes it, unless
+    background refreshes are disabled. An older one is refreshed first, and
+    still returned if the upstream fails or the circuit breaker is open.
+    Either way it is marked with STALE_KEY.
+    """
+    # The first call creates the session, which is timed with the imports
+    # it needs, requests among them.
+    session = get_session()
+    import requests
+
+    start = time.perf_counter()
     try:
-        first_response_json = requests.get(
-            WEATHER_SERVICE.format(BASE_URL=BASE_URL, city_name=city, API_KEY=API_KEY)
-        ).json()
-    except requests.exceptions.ConnectTimeout:
+        response = get_cached_response(session, url)
+        if response is None or (
+            response.is_expired
+            and not (_background_refresh_enabled and is_revalidatable(response))
+        ):
+            response = session.get(url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        elif response.is_expired:
+            refresh_in_background(url, endpoint)
+        response_json = response.json()
+    except requests.exceptions.RequestException:
+        upstream_requests.inc(endpoint, "network", "error")
+        upstream_latency.observe(time.perf_counter() - start, endpoint, "network")
         console.print("[bold red]Unable to connect. Please try again later.[/]")
         raise Abort()
-    return parse_api_response(first_response_json, compare, city)
+    elapsed = time.perf_counter() - start
+    if not getattr(response, "from_cache", False):
+        source = "network"
+    elif response.is_expired:
+        source = "stale"
+        response_json[STALE_KEY] = True
+    else:
+        source = "cache.db"
+    # Group responses carry no "cod" of their own when they succeed.
+    status = str(response_json.get("cod", SUCCESS_CODE))
+    upstream_requests.inc(endpoint, source, status)
+    upstream_latency.observe(elapsed, endpoint, source)
+    if timings_enabled():
+        record(f"http ({source})", elapsed)
+    return response_json
+
+
+def record_observation(observation: Observation) -> None:
+    """Append a current weather observation to the local history"""
+    if HISTORY_DIR:
+        append_observation(Path(HISTORY_DIR), observation)
+
+
+def cache_observation(city_key: str, observation: Observation) -> None:
+    """Keep a fresh observation in memory and in the local history"""
+    if not observation.stale:
+        weather_cache.set(city_key, observation)
+        record_observation(observation)
+
 
+def normalize_city(city: str) -> str:
+    """Collapse case and whitespace so equivalent inputs share a cache entry"""
+    return " ".join(city.split()).casefold()
 
-def call_forecast_api(city: str):
-    """Tries to call the Forecast API and return the received response"""
-    response = call_api(city)
-    if response[API_Response.JSON] is None:
+
+def round_coordinates(lat: float, lon: float) -> tuple[float, float]:
+    """Round coordinates so nearby lookups share a cache entry"""
+    return round(lat, COORDINATE_PRECISION), round(lon, COORDINATE_PRECISION)
+
+
+def fetch_current_weather(city: str) -> Observation | dict:
+    """Return the current weather of a city, from the cache when fresh
+
+    A failed lookup returns the error json the API answered with instead.
+    """
+    city_key = normalize_city(city)
+    observation = weather_cache.get(city_key)
+    if observation is None:
+        observation = weather_flight.do(
+            city_key, lambda: fetch_and_cache_current_weather(city_key)
+        )
+    return observation
+
+
+def fetch_and_cache_current_weather(city_key: str) -> Observation | dict:
+    """Request the current weather of a normalized city and cache a success"""
+    response_json = fetch_json(
+        WEATHER_SERVICE.format(
+            BASE_URL=BASE_URL, city_name=city_key, API_KEY=get_api_key()
+        ),
+        endpoint="weather",
+    )
+    if str(response_json.get("cod")) != SUCCESS_CODE:
+        return response_json
+    observation = parse_observation(response_json)
+    cache_observation(city_key, observation)
+    return observation
+
+
+@timed("call_api")
+def call_api(
+    city: str, compare: bool = False, interactive: bool = True
+) -> Observation | None:
+    """Tries to call the API and return the observation, or None if not found
+
+    An upstream failure raises Abort, or RateLimited when the API key ran
+    out of quota.
+    """
+    # Names the gazetteer lacks may be misspellings that were resolved before.
+    if (
+        normalize_city(city) not in weather_cache
+        and get_all_cities().find(city) is None
+    ):
+        location = get_alias_location(city)
+        if location is not None:
+            city = location.name
+    first_response = fetch_current_weather(city)
+    return parse_api_response(first_response, compare, city, interactive)
+
+
+def call_api_concurrently(
+    cities: list[str], compare: bool = False, interactive: bool = True
+) -> list[Observation | None]:
+    """Call the API for every city at once and return the responses in order"""
+    max_workers = max(1, min(MAX_CONCURRENT_REQUESTS, len(cities)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(
+            executor.map(lambda city: call_api(city, compare, interactive), cities)
+        )
+
+
+def fetch_group(city_ids: list[int]) -> dict[int, Observation]:
+    """Request the current weather of up to MAX_GROUP_SIZE city ids at once"""
+    response_json = fetch_json(
+        GROUP_SERVICE.format(
+            BASE_URL=BASE_URL,
+            city_ids=",".join(map(str, dict.fromkeys(city_ids))),
+            API_KEY=get_api_key(),
+        ),
+        endpoint="group",
+    )
+    if str(response_json.get("cod", SUCCESS_CODE)) != SUCCESS_CODE:
+        # Looking the cities up one by one would send a failing or throttled
+        # upstream up to MAX_GROUP_SIZE more requests; fail them together.
+        raise_for_upstream_failure(response_json, compare=True)
         raise Abort()
+    # Each entry has the shape of a single current weather response, minus "cod".
+    marker = {STALE_KEY: True} if response_json.get(STALE_KEY) else {}
+    return {
+        weather_json["id"]: parse_observation(dict(weather_json, **marker))
+        for weather_json in response_json.get("list", [])
+    }
+
+
+def call_api_group(
+    cities: list[tuple[str, int]],
+) -> list[tuple[str, Observation | None]]:
+    """Look up (city, city id) pairs with one group request
+
+    Cities the group response left out are looked up one by one instead. A
+    failed group request raises for every city, like a single lookup does.
+    """
+    observations_by_id = fetch_group([city_id for _, city_id in cities])
+    responses = []
+    for city, city_id in cities:
+        observation = observations_by_id.get(city_id)
+        if observation is None:
+            responses.append((city, call_api(city, compare=True, interactive=False)))
+            continue
+        cache_observation(normalize_city(city), observation)
+        responses.append((city, observation))
+    return responses
+
+
+def get_lookup_jobs(cities: Iterable[str]) -> Iterator[list[tuple[str, int | None]]]:
+    """Split a stream of cities into single lookups and groups of city ids
+
+    Cities already in the cache, or that the gazetteer has no id for, are
+    looked up on their own; the rest are gathered MAX_GROUP_SIZE at a time.
+    """
+    group = []
+    for city in cities:
+        city_id = None if normalize_city(city) in weather_cache else get_city_id(city)
+        if city_id is None:
+            yield [(city, None)]
+            continue
+        group.append((city, city_id))
+        if len(group) == MAX_GROUP_SIZE:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def iter_call_api(
+    cities: Iterable[str], max_workers: int = MAX_CONCURRENT_REQUESTS
+) -> Iterator[tuple[str, Observation | LookupFailure]]:
+    """Call the API for a stream of cities and yield each result as it lands
+
+    At most max_workers lookups run, and only as many more are queued, so
+    memory stays flat however long the stream is. When the gazetteer knows
+    city ids, up to MAX_GROUP_SIZE cities share one group request. Lookups
+    never prompt; a city that failed is yielded with the LookupFailure.
+    """
+
+    def run_job(
+        job: list[tuple[str, int | None]],
+    ) -> list[tuple[str, Observation | LookupFailure]]:
+        try:
+            if len(job) == 1:
+                city = job[0][0]
+                results = [(city, call_api(city, compare=True, interactive=False))]
+            else:
+                results = call_api_group(job)
+        except RateLimited:
+            return [(city, LookupFailure.RATE_LIMITED) for city, _ in job]
+        except Abort:
+            return [(city, LookupFailure.UNREACHABLE) for city, _ in job]
+        return [
+            (city, LookupFailure.NOT_FOUND if observation is None else observation)
+            for city, observation in results
+        ]
 
-    forecast_response = requests.get(
+    jobs = get_lookup_jobs(cities)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for job in jobs:
+            pending.add(executor.submit(run_job, job))
+            if len(pending) >= max_workers * 2:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+                next_job = next(jobs, None)
+                if next_job is not None:
+                    pending.add(executor.submit(run_job, next_job))
+
+
+@timed("call_forecast_api")
+def call_forecast_api(location: Location, compare: bool = False) -> Forecast | None:
+    """Tries to call the Forecast API for a resolved location, or None if it failed"""
+    coordinates = round_coordinates(location.lat, location.lon)
+    forecast = forecast_cache.get(coordinates)
+    if forecast is None:
+        forecast = forecast_flight.do(
+            coordinates, lambda: fetch_and_cache_forecast(coordinates)
+        )
+    if isinstance(forecast, Forecast):
+        return forecast
+    raise_for_upstream_failure(forecast, compare)
+    return handling_api_error_response(forecast, compare)
+
+
+def fetch_and_cache_forecast(coordinates: tuple[float, float]) -> Forecast | dict:
+    """Request the forecast of rounded coordinates and cache a fresh success
+
+    A failed lookup returns the error json the API answered with instead.
+    """
+    lat, lon = coordinates
+    response_json = fetch_json(
         FORECAST_SERVICE.format(
             BASE_URL=BASE_URL,
-            lat=response[API_Response.JSON]["coord"]["lat"],
-            lon=response[API_Response.JSON]["coord"]["lon"],
-            API_KEY=API_KEY,
-        )
-    ).json()
-    return forecast_response
+            lat=lat,
+            lon=lon,
+            API_KEY=get_api_key(),
+        ),
+        endpoint="forecast",
+    )
+    if str(response_json.get("cod")) != SUCCESS_CODE:
+        return response_json
+    forecast = parse_forecast(response_json)
+    if not forecast.stale:
+        forecast_cache.set(coordinates, forecast)
+    return forecast
 
 
 def handling_api_error_response(first_response_json, compare) -> None:
@@ -64,48 +656,111 @@ def handling_api_error_response(first_response_json, compare) -> None:
     return None
 
 
-def parse_api_response(first_response_json, compare, city) -> list:
+def raise_for_upstream_failure(response_json, compare) -> None:
+    """Raise unless the error response is about the request itself
+
+    400 and 404 mean the place could not be found. A 429 raises RateLimited;
+    anything else, such as a rejected API key, raises Abort like a network
+    failure does, so callers never mistake it for an unknown city.
+    """
+    status = str(response_json["cod"])
+    if status == Connection_Error.TOO_MANY_REQUESTS:
+        handling_rate_limited_response()
+        raise RateLimited()
+    if status not in (Connection_Error.BAD_REQUEST, Connection_Error.PAGE_NOT_FOUND):
+        handling_api_error_response(response_json, compare)
+        raise Abort()
+
+
+def handling_rate_limited_response() -> None:
+    """Tell the user the API key ran out of quota, whichever command is running"""
+    console.print(
+        "[bold red]The weather service is rate limiting this API key. Please try again in a minute.[/]"
+    )
+    return None
+
+
+@timed("parse_api_response")
+def parse_api_response(
+    first_response, compare, city, interactive=True
+) -> Observation | None:
     """Check if the api response and city name is valid"""
-    if first_response_json["cod"] == Connection_Error.BAD_REQUEST:
-        return_response_json = handling_api_error_response(first_response_json, compare)
-    elif first_response_json["cod"] == Connection_Error.PAGE_NOT_FOUND:
-        new_city_list = fuzzy_search(city.title().strip())
-        if new_city_list is None:
-            return_response_json = handling_api_error_response(
-                first_response_json, compare
-            )
-        else:
-            if len(new_city_list) != 1:
-                new_city = handling_multi_fuzzy_search_result(new_city_list)
-            else:
-                new_city = new_city_list[0]
+    if isinstance(first_response, Observation):
+        return first_response
+    raise_for_upstream_failure(first_response, compare)
+    if str(first_response["cod"]) != Connection_Error.PAGE_NOT_FOUND:
+        return handling_api_error_response(first_response, compare)
 
-            return_response_json = requests.get(
-                WEATHER_SERVICE.format(
-                    BASE_URL=BASE_URL, city_name=new_city, API_KEY=API_KEY
-                )
-            ).json()
-            city = new_city
-    else:
-        return_response_json = first_response_json
+    matches = rank_city_matches(city.title().strip())
+    new_city = resolve_city_matches(matches, interactive and _prompts_enabled)
+    if new_city is None:
+        fuzzy_fallbacks.inc(get_unresolved_outcome(matches))
+        return handling_api_error_response(first_response, compare)
+    response = fetch_current_weather(new_city)
+    if not isinstance(response, Observation):
+        fuzzy_fallbacks.inc("failed")
+        raise_for_upstream_failure(response, compare)
+        return handling_api_error_response(response, compare)
+    fuzzy_fallbacks.inc("resolved")
+    remember_alias(city, response.location)
+    return response
+
+
+def disable_prompts() -> None:
+    """Never ask which city was meant; unattended runs resolve or fail instead"""
+    global _prompts_enabled
+    _prompts_enabled = False
+
+
+def disable_background_refresh() -> None:
+    """Refresh expired responses before returning them, never after
+
+    Long-running commands come back for the same cities anyway, so serving
+    the expired answer now only shows stale data for another cycle.
+    """
+    global _background_refresh_enabled
+    _background_refresh_enabled = False
 
-    return [return_response_json, city]
 
+def resolve_city_matches(matches: list[CityMatch], interactive: bool) -> str | None:
+    """Return the city the user meant, or None if it cannot be decided"""
+    if interactive and len(matches) > 1:
+        return handling_multi_fuzzy_search_result(matches)
+    if interactive and matches:
+        return matches[0].name
+    match = pick_city_match(matches, FUZZY_AUTO_SELECT_SCORE)
+    return None if match is None else match.name
 
-def handling_multi_fuzzy_search_result(new_city_list: list[str]) -> str:
+
+def get_unresolved_outcome(matches: list[CityMatch]) -> str:
+    """Return the fuzzy_fallbacks outcome for matches that were not auto-selected"""
+    if not matches:
+        return "no_match"
+    if matches[0].score < FUZZY_AUTO_SELECT_SCORE:
+        return "low_confidence"
+    return "ambiguous"
+
+
+def handling_multi_fuzzy_search_result(matches: list[CityMatch]) -> str:
     """Ask user to choose which city they meant from the fuzzy search"""
-    for index, city in enumerate(new_city_list, start=1):
-        console.print(f"{index}. {city}")
-    while True:
-        try:
-            new_city = new_city_list[int(console.input("Which city do you mean? ")) - 1]
-        except ValueError:
-            console.print("[bold red]Please input numbers only.[/]")
-            console.print()
-            continue
-        except IndexError:
-            console.print(("[bold red]Please select from the given numbers only.[/]"))
-            console.print()
-            continue
-        break
+    # Concurrent lookups may all need a choice; ask one question at a time.
+    with _prompt_lock:
+        for index, match in enumerate(matches, start=1):
+            console.print(f"{index}. {match.name} [dim]({match.score:.0%} match)[/]")
+        while True:
+            try:
+                new_city = matches[
+                    int(console.input("Which city do you mean? ")) - 1
+                ].name
+            except ValueError:
+                console.print("[bold red]Please input numbers only.[/]")
+                console.print()
+                continue
+            except IndexError:
+                console.print(
+                    ("[bold red]Please select from the given numbers only.[/]")
+                )
+                console.print()
+                continue
+            break
     return new_city